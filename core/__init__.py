@@ -1,3 +1,11 @@
+from .stats import Stats
+from .grid import Grid
+from .backend import Backend, PySAT
+from .rules import Rules
+from .belief import Belief
 from .knowledge import Knowledge
 from .node import Node
-from .agent import Agent
\ No newline at end of file
+from .agent import Agent
+from .world import World
+from .trace import Trace
+from .generator import Generator
\ No newline at end of file
@@ -3,18 +3,45 @@
 #  Description to be updated.
 # =============================================================================
 
+import heapq
 import itertools
 import random
-from queue import PriorityQueue
+from array import array
+from collections import deque
 
+from . import Belief
+from . import Grid
 from . import Knowledge
 from . import Node
+from .stats import Stats
 
 class Agent:
+	directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
+	action_cost = {
+		'F': -10, # Forward
+		'L': -10, # Left
+		'R': -10, # Right
+		'G': -10, # Grab
+		'S': -100, # Shoot
+		'C': +10, # Climb
+		'H': -10, # Heal
+	}
+
+	# Per-cell flags, (possible, certain) bits for each property
+	PIT = (1, 2)
+	WUMPUS = (4, 8)
+	GAS = (16, 32)
+	POTION = (64, 128)
+	GOLD = (256, 512)
+	flag_bits = [('P', PIT), ('W', WUMPUS), ('P_G', GAS), ('H_P', POTION), ('G', GOLD)]
+
 # Constructor
-	def __init__(self):
-		self.size = 10
-		self.KB = Knowledge(self.size)
+	def __init__(self, size = 10, profile = False, priors = None):
+		# Priors are the danger densities of the map, see Knowledge
+		self.size = size
+		self.stats = Stats(profile)
+		self.KB = Knowledge(self.size, profile = profile, lazy = True, priors = priors)
+		self.grid = Grid.of(self.size)
 
 		self.position = (1, 1)
 		self.last_position = (1, 1)
@@ -25,6 +52,15 @@ class Agent:
 
 		self.history = []
 		self.visited = set({(1, 1)})
+		self.belief = self.KB.snapshot()
+		self.flags = self.__assess()
+
+		# Remaining (action, state, score) steps of the current plan, the tier it
+		# was planned under, and the state and score the agent should be in now
+		self.plan = deque()
+		self.__hard = True
+		self.__expected = None
+		self.__penalties = None # Expected score loss of risky cells, built on demand
 
 # Private
 	def __update(self, properties):
@@ -37,20 +73,19 @@ class Agent:
 			'H_P': 'G_L'
 		}
 
-		# Update knowledge
+		# Update knowledge in a single batch
+		self.KB.begin()
 		for property in all_properties:
 			if property in properties:
 				self.KB.remove(property, *self.position, False)
 				self.KB.add(property, *self.position, True)
 			else:
 				if property in elements and self.KB.has(property, *self.position):
-					x, y = self.position[0], self.position[1]
-					cells = [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
-					cells = [(i, j) for i, j in cells if 1 <= i <= self.size and 1 <= j <= self.size]
-					for i, j in cells: self.KB.remove(percept[property], i, j, True)
+					for i, j in self.grid.around(*self.position): self.KB.remove(percept[property], i, j, True)
 
 				self.KB.remove(property, *self.position, True)
 				self.KB.add(property, *self.position, False)
+		changed = self.KB.commit()
 
 		# Update agent stats
 		for property in properties:
@@ -63,71 +98,242 @@ class Agent:
 				self.health = 0
 				self.score -= 10000
 
+		return changed
+
 	def __KB_check(self):
+		possible = {property: self.belief.possible(property) for property in ('W', 'P', 'P_G', 'H_P')}
 		for i in range(self.size, 0, -1):
 			for j in range(1, self.size + 1):
+				index = (i - 1) * self.size + j - 1
 				if (i, j) == self.position: print('X', end = ' ')
-				elif self.KB.possible('W', i, j): print('W', end = ' ')
-				elif self.KB.possible('P', i, j): print('P', end = ' ')
-				elif self.KB.possible('P_G', i, j): print('G', end = ' ')
-				elif self.KB.possible('H_P', i, j): print('H', end = ' ')
+				elif possible['W'][index]: print('W', end = ' ')
+				elif possible['P'][index]: print('P', end = ' ')
+				elif possible['P_G'][index]: print('G', end = ' ')
+				elif possible['H_P'][index]: print('H', end = ' ')
 				else: print('.', end = ' ')
 			print()
 
+	def __assess(self):
+		# Flags are laid out on an (N + 1) x (N + 1) grid indexed by x * (N + 1) + y,
+		# so the exit (0, 0) is a valid, flagless cell
+		stride = self.size + 1
+		flags = array('H', [0]) * (stride * stride)
+
+		cells = self.grid.cells
+		for property, (possible, certain) in Agent.flag_bits:
+			layer = self.belief.layer(property)
+			for (x, y), flag, maybe in zip(cells, layer, self.belief.possible(property)):
+				if flag & Belief.CERTAIN: flags[x * stride + y] |= certain
+				if maybe: flags[x * stride + y] |= possible
+
+		return flags
+
+	def __masks(self, fail_hard = True):
+		# Flags that make a cell deadly, and flags that make it poisonous
+		bit = 0 if fail_hard else 1
+		return Agent.PIT[bit] | Agent.WUMPUS[bit], Agent.GAS[bit]
+
 	def __safe(self, x, y, fail_hard = True):
-		if fail_hard:
-			return not(self.KB.possible('W', x, y) or self.KB.possible('P', x, y) or self.KB.possible('P_G', x, y))
-		else:
-			return not(self.KB.certain('W', x, y) or self.KB.certain('P', x, y) or self.KB.certain('P_G', x, y))
-
-	def __search(self, fail_hard = True):
-		goals = [pos for pos in itertools.product(range(1, self.size + 1), repeat = 2) if self.__safe(*pos, fail_hard) and pos not in self.visited]
-		if len(goals) == 0: goals = [(0, 0)]
-		
-		visited = set()
-		predecessor = dict()
-		frontier = PriorityQueue()
-
-		frontier.put(Node(
-			(self.position, self.direction, self.health, self.has_potion),
-			None,
-			None,
-			self.direction,
-			self.score,
-			self.health,
-			self.has_potion
-		))
-
-		while not frontier.empty():
-			node = frontier.get()
-			state, par, act, dir, score, health, potion = node.state, node.parent, node.action, node.dir, node.score, node.health, node.potion
-
-			if state in visited: continue
-			if health <= 0: continue
-			
-			visited.add(state)
-			if predecessor.get(state) is None: predecessor[state] = (par, act)
-
-			if state[0] in goals:
-				return self.__trace(predecessor, state)
-			
-			directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-			action_cost = {
-				'F': -10, # Forward
-				'L': -10, # Left
-				'R': -10, # Right
-				'G': -10, # Grab
-				'S': -100, # Shoot
-				'C': +10, # Climb
-				'H': -10, # Heal
-			}
-
-			for action in action_cost:
+		deadly, poisonous = self.__masks(fail_hard)
+		return not (self.flags[x * (self.size + 1) + y] & (deadly | poisonous))
+
+	def __risk(self):
+		# Expected score loss of stepping into each cell that is possibly but not
+		# certainly dangerous, from the knowledge base's danger probabilities.
+		# Gas only costs when it would finish the agent off, so it is kept apart
+		if self.__penalties is not None: return self.__penalties
+
+		stride = self.size + 1
+		risks = self.KB.risks()
+		deadly = array('i', [0]) * (stride * stride)
+		gas = array('i', [0]) * (stride * stride)
+
+		for x, y in self.grid.cells:
+			cell = self.flags[x * stride + y]
+			index = (x - 1) * self.size + y - 1
+			if cell & (Agent.PIT[0] | Agent.WUMPUS[0]) and not cell & (Agent.PIT[1] | Agent.WUMPUS[1]):
+				deadly[x * stride + y] = round(10000 * (1 - (1 - risks['P'][index]) * (1 - risks['W'][index])))
+			if cell & Agent.GAS[0] and not cell & Agent.GAS[1]:
+				gas[x * stride + y] = round(10000 * risks['P_G'][index])
+
+		self.__penalties = (deadly, gas)
+		return self.__penalties
+
+	def __heuristic(self, goals):
+		# Cost of reaching the nearest goal on an empty grid, where every forward
+		# move and turn costs 10; dangers are ignored, so it never overestimates.
+		# On an empty grid that cost has a closed form, so it is only worked out
+		# for the cells the search actually reaches, instead of a BFS over the
+		# whole grid that every search would pay for
+		size = self.size
+		stride = size + 1
+
+		# Reaching the exit means climbing out of (1, 1), which earns 10 points
+		if goals == [(0, 0)]: seeds, start = [(1, 1)], -10
+		else: seeds, start = goals, 0
+
+		marked = bytearray(stride * stride)
+		for x, y in seeds: marked[x * stride + y] = 1
+		memo = dict()
+
+		def turns(dir, ax, ay):
+			# Fewest turns to cover the offset: none straight ahead, one to the
+			# side, two when the goal lies behind
+			dx, dy = Agent.directions[dir]
+			along, across = ax * dx + ay * dy, ax * dy - ay * dx
+			if along < 0: return 2
+			return 0 if across == 0 else 1
+
+		def nearby(x, y):
+			# Goals at the smallest Manhattan distance and up to two steps
+			# further, as a goal straight ahead saves at most two turns
+			if len(seeds) <= size: return seeds
+			found = []
+			limit = 2 * size
+			radius = 0
+			while radius <= limit:
+				for i in range(max(1, x - radius), min(size, x + radius) + 1):
+					j = radius - abs(i - x)
+					if 1 <= y + j <= size and marked[i * stride + y + j]: found.append((i, y + j))
+					if j > 0 and 1 <= y - j <= size and marked[i * stride + y - j]: found.append((i, y - j))
+				if found and limit > radius + 2: limit = radius + 2
+				radius += 1
+			return found
+
+		def cost(position, dir):
+			if position == (0, 0): return 0
+			costs = memo.get(position)
+			if costs is None:
+				x, y = position
+				candidates = [(i - x, j - y) for i, j in nearby(x, y)]
+				costs = memo[position] = tuple(start + 10 * min(abs(ax) + abs(ay) + turns(d, ax, ay) for ax, ay in candidates) for d in range(4))
+			return costs[dir]
+
+		return cost
+
+	def __search(self):
+		# A single A* pass over both safety tiers, ordered by (tier, f). Hard
+		# nodes only treat cells that are safe for sure as safe. Soft nodes took a
+		# chance on a cell that is possibly, but not certainly, dangerous, and are
+		# only popped once no hard plan exists. Pure nodes have not met such a
+		# cell yet, so they are valid in both tiers. Gold is only grabbed at the
+		# root, where its reward comes before any state is settled, and every
+		# other edge costs at least the drop in the heuristic, so no state is
+		# settled before its best score is known.
+		stride = self.size + 1
+		flags = self.flags
+		hard_deadly, hard_poisonous = self.__masks(True)
+		soft_deadly, soft_poisonous = self.__masks(False)
+		risky = Agent.PIT[0] | Agent.WUMPUS[0] | Agent.GAS[0]
+
+		# Goal bitmap: bit 1 marks hard goals, bit 2 soft goals, and the exit
+		# (0, 0) stands in for a tier without any
+		goals = bytearray(stride * stride)
+		for x, y in self.grid.cells:
+			if (x, y) in self.visited: continue
+			if self.__safe(x, y, True): goals[x * stride + y] |= 1
+			if self.__safe(x, y, False): goals[x * stride + y] |= 2
+
+		for bit in (1, 2):
+			if not any(goal & bit for goal in goals): goals[0] |= bit
+
+		def targets(bit):
+			return [(index // stride, index % stride) for index, goal in enumerate(goals) if goal & bit]
+
+		heuristic = self.__heuristic(targets(1))
+		closed = dict()
+		frontier = []
+		counter = itertools.count()
+		popped = 0
+
+		# Soft nodes wait in a list until the hard tier runs dry, so the soft
+		# heuristic is only computed when it is actually needed
+		deferred = []
+		closed_soft = dict()
+		settled = dict() # Labels of each (cell, direction) settled by a pure node
+		soft = False
+
+		# Closed sets keep a Pareto front of (health, potion, score) labels per
+		# (cell, direction): a state is as good as any other there with no more
+		# health, no potion it lacks and no better score, so it is dominated
+		def dominated(labels, key, health, potion, score):
+			for h, p, g in labels.get(key, ()):
+				if h >= health and p >= potion and g >= score: return True
+			return False
+
+		def settle(labels, key, health, potion, score):
+			front = labels.setdefault(key, [])
+			front[:] = [(h, p, g) for h, p, g in front if not (health >= h and potion >= p and score >= g)]
+			front.append((health, potion, score))
+
+		def admit(key, health, potion, score, tier):
+			# Dominated hard and soft nodes are dropped before they are even built,
+			# pure nodes are not as they may still spawn soft candidates
+			if health <= 0: return False
+			if tier == Node.HARD: return not dominated(closed, key, health, potion, score)
+			return not (dominated(closed_soft, key, health, potion, score) or dominated(settled, key, health, potion, score))
+
+		def push(node):
+			if node.health <= 0: return
+			if node.tier == Node.SOFT and not soft:
+				deferred.append(node)
+				return
+
+			(x, y), dir = node.state[0], node.dir
+			heapq.heappush(frontier, (-node.score + heuristic((x, y), dir), -node.health, -node.potion, next(counter), node))
+
+		push(Node((self.position, self.direction, self.health, self.has_potion), None, None, self.direction, self.score, self.health, self.has_potion))
+
+		while True:
+			if not frontier:
+				if soft or not deferred:
+					self.stats.count('pushed', next(counter))
+					self.stats.count('popped', popped)
+					return None
+
+				# Switch to the soft tier, carrying over the deferred nodes
+				soft = True
+				heuristic = self.__heuristic(targets(2))
+				for node in deferred: push(node)
+				deferred.clear()
+				continue
+
+			node = heapq.heappop(frontier)[-1]
+			popped += 1
+			state, tier, dir, score, health, potion = node.state, node.tier, node.dir, node.score, node.health, node.potion
+			goal = goals[state[0][0] * stride + state[0][1]]
+			key = (state[0], dir)
+
+			if tier == Node.SOFT:
+				if goal & 2:
+					self.__hard = False
+					self.stats.count('pushed', next(counter))
+					self.stats.count('popped', popped)
+					return self.__trace(node)
+				if dominated(closed_soft, key, health, potion, score) or dominated(settled, key, health, potion, score): continue
+				settle(closed_soft, key, health, potion, score)
+			else:
+				if goal & 1:
+					self.__hard = True
+					self.stats.count('pushed', next(counter))
+					self.stats.count('popped', popped)
+					return self.__trace(node)
+
+				# A pure node is also a soft candidate, keep it for the soft tier if
+				# it reached a soft goal or its hard state was already expanded
+				expanded = dominated(closed, key, health, potion, score)
+				if tier == Node.PURE and (goal & 2 or expanded):
+					push(Node(state, node.parent, node.action, dir, score, health, potion, Node.SOFT))
+				if expanded: continue
+				settle(closed, key, health, potion, score)
+				if tier == Node.PURE: settle(settled, key, health, potion, score)
+
+			for action, cost in Agent.action_cost.items():
 				x, y = state[0]
-				dx, dy = directions[dir]
+				dx, dy = Agent.directions[dir]
 
 				new_dir = dir
-				new_score = score
+				new_score = score + cost
 				new_health = health
 				new_potion = potion
 
@@ -139,61 +345,98 @@ class Agent:
 				elif action == 'R':
 					new_dir = (dir + 3) % 4
 				elif action == 'G':
-					new_potion = self.KB.certain('H_P', x, y)
-					gold = self.KB.certain('G', x, y)
+					# Gold is the one reward the heuristic cannot see coming. It is only
+					# ever certain in the agent's own room, so it is only grabbed from the
+					# root, which also keeps a plan from taking it twice
+					new_potion = bool(flags[x * stride + y] & Agent.POTION[1])
+					gold = node.parent is None and bool(flags[x * stride + y] & Agent.GOLD[1])
 					
 					if not (gold or new_potion): continue
 					if gold: new_score += 5000
 					else: new_potion = new_potion or potion
 				elif action == 'C':
-					if (x, y) != (1, 1): continue
+					# Climbing out is a dead end unless the exit is a goal
+					if (x, y) != (1, 1) or not goals[0]: continue
 					x, y = 0, 0
 				elif action == 'H':
 					if not potion: continue
 					new_health = min(100, health + 25)
 					new_potion = False
 
-				if fail_hard:
-					if self.KB.possible('P_G', x, y) and (x, y) != state[0]:
-						new_health = max(0, health - 25)
-					if self.KB.possible('P', x, y) or self.KB.possible('W', x, y):
-						new_score -= 10000
-						new_health = 0
-				else:
-					if self.KB.certain('P_G', x, y) and (x, y) != state[0]:
-						new_health = max(0, health - 25)
-					if self.KB.certain('P', x, y) or self.KB.certain('W', x, y):
-						new_score -= 10000
-						new_health = 0
-
-				new_score += action_cost[action]
-				frontier.put(Node(
-					((x, y), new_dir, new_health, new_potion),
-					state,
-					action,
-					new_dir,
-					new_score,
-					new_health,
-					new_potion
-				))
-
-		if fail_hard: return self.__search(fail_hard = False)
-
-	def __trace(self, predecessor: dict, end):
-		actions = []
-
-		while end != None:
-			actions.append(predecessor[end][1])
-			end = predecessor[end][0]
-
-		while len(actions) > 0 and actions[-1] is None: actions.pop()
-		return actions[-1]
+				cell = flags[x * stride + y]
+				moved = (x, y) != state[0]
+				make = lambda score, health, tier: Node(((x, y), new_dir, health, new_potion), node, action, new_dir, score, health, new_potion, tier)
+
+				# Soft semantics: only certain dangers count, and entering a possibly
+				# dangerous cell costs the score it is expected to lose
+				soft_health = 0 if cell & soft_deadly else max(0, new_health - 25) if cell & soft_poisonous and moved else new_health
+				soft_score = new_score
+				if moved and cell & risky:
+					deadly, gas = self.__risk()
+					soft_score -= deadly[x * stride + y] + (gas[x * stride + y] if new_health <= 25 else 0)
+
+				if tier == Node.SOFT:
+					if admit(((x, y), new_dir), soft_health, new_potion, soft_score, Node.SOFT): push(make(soft_score, soft_health, Node.SOFT))
+					continue
+
+				# Hard semantics: possible dangers count too, and whenever the two
+				# disagree a pure node also branches into the soft tier
+				hard_health = 0 if cell & hard_deadly else max(0, new_health - 25) if cell & hard_poisonous and moved else new_health
+				if tier == Node.PURE and (hard_health != soft_health or soft_score != new_score):
+					if admit(((x, y), new_dir), hard_health, new_potion, new_score, Node.HARD): push(make(new_score, hard_health, Node.HARD))
+					if admit(((x, y), new_dir), soft_health, new_potion, soft_score, Node.SOFT): push(make(soft_score, soft_health, Node.SOFT))
+				elif tier == Node.PURE or admit(((x, y), new_dir), hard_health, new_potion, new_score, tier):
+					push(make(new_score, hard_health, tier))
+
+	def __trace(self, node):
+		steps = deque()
+
+		while node.action is not None:
+			steps.appendleft((node.action, node.state, node.score))
+			node = node.parent
+
+		return steps
+
+	def __bound(self, x, y):
+		# Cost of reaching (x, y) from the current state on an empty grid: every
+		# forward move costs 10, plus 10 for each turn that is unavoidable
+		dx, dy = x - self.position[0], y - self.position[1]
+		fx, fy = Agent.directions[self.direction]
+		ahead, side = dx * fx + dy * fy, dx * fy - dy * fx
+
+		turns = 0
+		if side != 0: turns = 1 if ahead >= 0 else 2
+		elif ahead < 0: turns = 2
+		return 10 * (abs(dx) + abs(dy) + turns)
+
+	def __replan(self, previous):
+		# Decides whether a belief change invalidates the current plan. It stands
+		# when no cell on its path changed and every other change either only
+		# adds danger, or frees a cell too far away to beat the remaining cost
+		if len(self.plan) == 0: return False
+		if not self.__hard or self.plan[-1][1][0] == (0, 0): return True
+
+		stride = self.size + 1
+		path = {x * stride + y for _, ((x, y), _, _, _), _ in self.plan}
+		path.add(self.position[0] * stride + self.position[1])
+
+		danger = Agent.PIT[0] | Agent.PIT[1] | Agent.WUMPUS[0] | Agent.WUMPUS[1] | Agent.GAS[0] | Agent.GAS[1]
+		loot = Agent.POTION[1] | Agent.GOLD[1]
+		remaining = self.__expected[1] - self.plan[-1][2]
+
+		for index, (old, new) in enumerate(zip(previous, self.flags)):
+			if old == new: continue
+			if index in path: return True
+			if (new & ~old) & loot: return True
+			if (old & ~new) & danger and self.__bound(index // stride, index % stride) < remaining: return True
+
+		return False
 	
 	def __take_action(self, action):
 		self.last_position = self.position
 
 		if action == 'F':
-			dx, dy = [(0, 1), (1, 0), (0, -1), (-1, 0)][self.direction]
+			dx, dy = Agent.directions[self.direction]
 			self.position = (self.position[0] + dx, self.position[1] + dy)
 		elif action == 'L':
 			self.direction = (self.direction + 1) % 4
@@ -208,23 +451,47 @@ class Agent:
 			self.health = min(100, self.health + 25)
 			self.has_potion = False
 
-		cost = {
-			'F': -10,
-			'L': -10,
-			'R': -10,
-			'G': -10,
-			'S': -100,
-			'C': +10,
-			'H': -10,
-		}[action]
-
-		self.score += cost
+		self.score += Agent.action_cost[action]
 		self.visited.add(self.position)
 		self.history.append(action)
 
 # Public
 	def move(self, properties):
-		self.__update(properties)
-		action = 'G' if ('G' in properties) or ('H_P' in properties) else self.__search()
+		start = self.stats.start()
+
+		# Belief only needs recomputing when the percepts changed the KB
+		if self.__update(properties):
+			previous = self.flags
+			self.belief = self.KB.snapshot()
+			self.flags = self.__assess()
+			self.__penalties = None
+			if self.__replan(previous):
+				self.stats.count('replans')
+				self.plan.clear()
+
+		state = (self.position, self.direction, self.health, self.has_potion)
+		if ('G' in properties) or ('H_P' in properties):
+			action = 'G'
+			self.plan.clear()
+		else:
+			# Keep following the plan while the agent is where it expected to be
+			if len(self.plan) == 0 or self.__expected[0] != state:
+				search = self.stats.start()
+				self.plan = self.__search() or deque()
+				self.__expected = (state, self.score)
+				self.stats.stop('search', search)
+			else:
+				self.stats.count('plan_reused')
+
+			action = None
+			if len(self.plan) > 0:
+				action, next_state, score = self.plan.popleft()
+				self.__expected = (next_state, score)
+
 		if action is not None: self.__take_action(action)
-		return action
\ No newline at end of file
+		self.stats.stop('move', start, sample = True)
+		return action
+
+	def report(self):
+		# Everything the agent and its knowledge base measured, ready for JSON
+		return {'agent': self.stats.as_dict(), 'knowledge': self.KB.stats.as_dict()}
\ No newline at end of file
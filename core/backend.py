@@ -0,0 +1,56 @@
+# backend.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+from pysat.solvers import Solver
+
+class Backend:
+	# The complete tier of a component, only reached once unit propagation
+	# cannot decide a query. A backend is built from the component's clauses
+	# and must decide them under assumptions as more clauses are added
+
+# Constructor
+	def __init__(self, clauses):
+		pass
+
+# Public
+	def add_clause(self, clause):
+		raise NotImplementedError
+
+	def solve(self, assumptions = ()):
+		raise NotImplementedError
+
+	def model(self):
+		# The model of the last successful solve, as a list of literals where
+		# model[variable - 1] holds the value of each variable
+		raise NotImplementedError
+
+	def set_phases(self, literals):
+		# Optional hint for the values of the next model
+		pass
+
+	def delete(self):
+		pass
+
+class PySAT(Backend):
+# Constructor
+	def __init__(self, clauses, name = 'glucose3'):
+		# Any pysat solver name
+		self.__solver = Solver(name = name, bootstrap_with = clauses)
+
+# Public
+	def add_clause(self, clause):
+		self.__solver.add_clause(clause)
+
+	def solve(self, assumptions = ()):
+		return self.__solver.solve(assumptions = assumptions)
+
+	def model(self):
+		return self.__solver.get_model()
+
+	def set_phases(self, literals):
+		self.__solver.set_phases(literals)
+
+	def delete(self):
+		self.__solver.delete()
@@ -0,0 +1,46 @@
+# belief.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+from .grid import Grid
+
+class Belief:
+	CERTAIN = 1
+	IMPOSSIBLE = 2
+
+# Constructor
+	def __init__(self, size, properties, percept):
+		self.size = size
+		self.properties = properties
+		self.percept = percept
+		self.grid = Grid.of(size)
+
+		# One byte per (property, cell), laid out property-major
+		self.__index = {property: i * size * size for i, property in enumerate(properties)}
+		self.__grid = bytearray(len(properties) * size * size)
+
+# Private
+	def __cell(self, property, x, y):
+		return self.__index[property] + (x - 1) * self.size + (y - 1)
+
+# Public
+	def layer(self, property):
+		# Flags of every cell for one property, indexed by (x - 1) * size + (y - 1)
+		start = self.__index[property]
+		return self.__grid[start : start + self.size * self.size]
+
+	def set(self, property, x, y, flags):
+		self.__grid[self.__cell(property, x, y)] = flags
+
+	def possible(self, property):
+		# Whether each cell may hold the property, indexed like layer. It must
+		# not be ruled out, and a property with a percept also needs a neighbour
+		# that certainly senses it
+		layer = self.layer(property)
+		if property not in self.percept:
+			return [not flags & Belief.IMPOSSIBLE for flags in layer]
+
+		percept = self.layer(self.percept[property])
+		return [not flags & Belief.IMPOSSIBLE and any(percept[neighbour] & Belief.CERTAIN for neighbour in neighbours)
+			for flags, neighbours in zip(layer, self.grid.neighbours)]
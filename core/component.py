@@ -0,0 +1,150 @@
+# component.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+import functools
+
+from .backend import PySAT
+from .propagator import Propagator
+
+class Component:
+# Constructor
+	def __init__(self, clauses, stats, backend = functools.partial(PySAT, name = 'glucose3')):
+		# Variables are renumbered from 1 so models only span this component
+		self.variables = dict() # global variable -> local variable
+		self.clauses = clauses
+		self.stats = stats
+
+		local = [[self.__local(literal) for literal in clause] for clause in clauses]
+		self.__top = len(self.variables)
+		self.__locals = range(1, self.__top + 1)
+
+		# Two inference tiers: unit propagation decides most queries and finds
+		# most models on its own, the backend is only built and asked when
+		# propagation cannot decide
+		self.__propagator = Propagator(local)
+		self.__backend = backend
+		self.__solver = None
+		self.__satisfiable = None
+		self.__models = [] # every model found so far, each one refutes the literals it falsifies
+		self.__backbone = None
+		self.__cache = dict()
+
+# Private
+	def __local(self, literal):
+		variable = abs(literal)
+		if variable not in self.variables: self.variables[variable] = len(self.variables) + 1
+		return self.variables[variable] * (1 if literal > 0 else -1)
+
+	def __solver_tier(self):
+		if self.__solver is None:
+			self.__solver = self.__backend(self.__propagator.clauses)
+			self.stats.count('backends_built')
+		return self.__solver
+
+	def __solve(self, assumptions):
+		start = self.stats.start()
+		result = self.__solver_tier().solve(assumptions)
+		self.stats.stop('solve', start)
+		return result
+
+	def __model(self, assumptions, phases = None):
+		# Finds and keeps a model where the assumptions hold, by propagation
+		# first and by the backend only if that gives up
+		found = self.__propagator.complete(self.__locals, assumptions, phases)
+		if found is not None:
+			self.__models.append([found[variable] for variable in self.__locals])
+			return True
+
+		if not self.__solve(assumptions): return False
+		self.__models.append(self.__solver_tier().model())
+		return True
+
+# Public
+	def satisfiable(self):
+		if self.__satisfiable is None: self.__satisfiable = self.__model([])
+		return self.__satisfiable
+
+	def entails(self, literal):
+		if self.__backbone is not None: return self.__backbone.get(abs(literal)) == literal
+		if literal in self.__cache:
+			self.stats.count('cache_hits')
+			return self.__cache[literal]
+
+		# Refuting the negation by propagation alone proves the literal
+		self.stats.count('cache_misses')
+		negation = -self.__local(literal)
+		if self.__propagator.probe([negation]) is None:
+			self.stats.count('propagation_answers')
+			self.__cache[literal] = True
+
+		# Any known model that agrees with the negation disproves it
+		elif any(model[abs(negation) - 1] == negation for model in self.__models):
+			self.stats.count('model_answers')
+			self.__cache[literal] = False
+		else:
+			self.__cache[literal] = not self.__model([negation])
+		return self.__cache[literal]
+
+	def known(self, literal = None):
+		# Without a literal, whether the whole backbone is known
+		return self.__backbone is not None or (literal is not None and literal in self.__cache)
+
+	def learn(self, answers):
+		# Merges answers worked out elsewhere, such as by a replica: a dict is a
+		# whole backbone, anything else pairs of literal and entailment
+		if isinstance(answers, dict): self.__backbone = answers
+		else: self.__cache.update(answers)
+
+	def backbone(self):
+		# Every literal the component entails, keyed by its global variable
+		if self.__backbone is not None: return self.__backbone
+		if not self.satisfiable(): return dict()
+
+		# The first model proposes a value for every variable. Propagation
+		# settles most proposals: one whose negation propagates to a conflict is
+		# entailed, and a model found by propagation with every other proposal
+		# flipped refutes each proposal it disagrees with
+		model = self.__models[0]
+		candidates = {variable: model[local - 1] for variable, local in self.variables.items()}
+		entailed = dict()
+		for variable in list(candidates):
+			literal = candidates.get(variable)
+			if literal is None: continue
+			if self.__propagator.probe([-literal]) is None:
+				self.stats.count('propagation_answers')
+				entailed[variable] = candidates.pop(variable)
+				continue
+
+			phases = {abs(other): -other for other in candidates.values()}
+			found = self.__propagator.complete(self.__locals, [-literal], phases)
+			if found is not None:
+				self.stats.count('model_answers')
+				candidates = {variable: literal for variable, literal in candidates.items() if found[abs(literal)] == literal}
+
+		# Whatever propagation could not settle goes to the backend: each round
+		# asks for a model that flips at least one remaining proposal, with the
+		# phases pointing away from all of them, which refutes every proposal
+		# the model disagrees with; once no such model exists the remaining
+		# proposals are all entailed
+		while len(candidates) > 0:
+			self.__top += 1
+			selector = self.__top
+			flipped = [-literal for literal in candidates.values()]
+			solver = self.__solver_tier()
+			solver.add_clause([-selector] + flipped)
+			solver.set_phases(flipped)
+
+			# Read the model before retiring the selector, some solvers drop it on any new clause
+			satisfiable = self.__solve([selector])
+			if satisfiable: model = solver.model()
+			solver.add_clause([-selector])
+			if not satisfiable: break
+
+			candidates = {variable: literal for variable, literal in candidates.items() if model[abs(literal) - 1] == literal}
+
+		entailed.update(candidates)
+		inverse = {local: variable for variable, local in self.variables.items()}
+		self.__backbone = {inverse[abs(literal)]: inverse[abs(literal)] * (1 if literal > 0 else -1) for literal in entailed.values()}
+		return self.__backbone
@@ -0,0 +1,40 @@
+# generator.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+import os
+import random
+
+class Generator:
+	# Probability of a room holding each element, roughly the testcase densities
+	defaults = {'P': 0.05, 'W': 0.04, 'P_G': 0.04, 'H_P': 0.03, 'G': 0.03}
+
+# Constructor
+	def __init__(self, seed = None, pit = defaults['P'], wumpus = defaults['W'], gas = defaults['P_G'], potion = defaults['H_P'], gold = defaults['G']):
+		self.densities = [('P', pit), ('W', wumpus), ('P_G', gas), ('H_P', potion), ('G', gold)]
+		self.random = random.Random(seed)
+
+		if sum(density for _, density in self.densities) > 1:
+			raise ValueError("Element densities must add up to at most 1")
+
+# Private
+	def __room(self):
+		value = self.random.random()
+		for element, density in self.densities:
+			if value < density: return element
+			value -= density
+		return '-'
+
+# Public
+	def generate(self, size):
+		rows = [[self.__room() for _ in range(size)] for _ in range(size)]
+		rows[size - 1][0] = 'A' # The agent starts in an empty room at the bottom left
+		return rows
+
+	def write(self, path, size):
+		rows = self.generate(size)
+		os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+		with open(path, 'w') as file:
+			file.write(f"{size}\n")
+			file.write('\n'.join('.'.join(row) for row in rows))
@@ -0,0 +1,33 @@
+# grid.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+import itertools
+
+class Grid:
+	__shared = dict() # Process-wide cache, keyed by grid size
+
+# Constructor
+	def __init__(self, size):
+		# Cells are indexed (x - 1) * size + (y - 1) for 1-based rooms, which is
+		# also i * size + j for the 0-based rows and columns of a world
+		self.size = size
+		self.cells = tuple(itertools.product(range(1, size + 1), repeat = 2))
+		self.neighbours = tuple(self.__neighbours(x, y) for x, y in self.cells) # index -> neighbour indices
+		self.adjacent = tuple(tuple(self.cells[index] for index in neighbours) for neighbours in self.neighbours) # index -> neighbour rooms
+
+# Private
+	def __neighbours(self, x, y):
+		cells = [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
+		return tuple((i - 1) * self.size + j - 1 for i, j in cells if 1 <= i <= self.size and 1 <= j <= self.size)
+
+# Public
+	@classmethod
+	def of(cls, size):
+		# Tables only depend on the grid size, so every size is built once
+		if size not in cls.__shared: cls.__shared[size] = cls(size)
+		return cls.__shared[size]
+
+	def around(self, x, y):
+		return self.adjacent[(x - 1) * self.size + y - 1]
@@ -3,115 +3,459 @@
 #  Description to be updated.
 # =============================================================================
 
+import functools
 import itertools
-import time
-import copy
+import math
 
-from pysat.formula import CNF
-from pysat.solvers import Glucose3
+from .backend import PySAT
+from .grid import Grid
+from .rules import Rules
+from .belief import Belief
+from .component import Component
+from .generator import Generator
+from .propagator import Propagator
+from .replicas import Replicas
+from .stats import Stats
 
 class Knowledge:
+	# Frontier groups over more dangers than this are estimated, since an exact
+	# count can grow exponentially with them
+	counting_limit = 20
+
 # Constructor
-	def __init__(self, size):
+	def __init__(self, size, cache = None, profile = False, lazy = False, solver = 'glucose3', workers = 0, backend = None, priors = None):
+		# The disk cache holds a compiled rule base, which lazy grounding never builds
+		if lazy and cache is not None:
+			raise ValueError("a rule cache only applies to an eagerly grounded knowledge base")
+
 		self.size = size
+		self.lazy = lazy
+		# The complete tier of every component: a Backend factory taking the
+		# component's clauses, by default the pysat solver named by `solver`
+		self.solver = solver
+		self.backend = backend if backend is not None else functools.partial(PySAT, name = solver)
+		self.stats = Stats(profile)
+		# Prior chance of a room holding each danger, which should match the
+		# densities the map was generated with; missing ones use the defaults
+		priors = priors or dict()
+		self.priors = {property: priors.get(property, Generator.defaults[property]) for property in ('P', 'W', 'P_G')}
+
+		# Lazy knowledge bases start from an empty rule set and ground the rules
+		# of each cell once a fact lands close enough to constrain it
+		self.rules = Rules(size, []) if lazy else Rules.compile(size, cache)
+		self.grid = Grid.of(size)
 		self.percept = {
 			'P': 'B',
 			'W': 'S',
 			'P_G': 'W_H',
 			'H_P': 'G_L'
 		}
+		self.properties = ['B', 'S', 'W_H', 'G_L', 'P', 'W', 'P_G', 'H_P', 'G']
 		
-		self.__map = dict()
-		self.__cache = dict()
 		self.__clauses = set()
-		self.__solver = Glucose3()
+		self.__changes = None
+
+		# Facts and the rules they force are fixed by unit propagation over the
+		# grounded rules, the rest splits into independent components, each
+		# with its own solver
+		self.__propagator = Propagator()
+		self.__added = set() # facts not propagated yet
+		self.__retracted = False # a removed fact forces propagation to start over
+		self.__dirty = True
+		self.__consistent = True
+		self.__assigned = dict() # variable -> literal
+		self.__components = dict() # clauses -> component, reused while unchanged
+		self.__owner = dict() # variable -> component
+		self.__scanned = 0 # grounded rules already split into components
+		self.__trail = 0 # assignments already split into components
+
+		# Danger marginals of each group of frontier clauses, reused until a
+		# percept changes the group
+		self.__risks = dict()
+
+		# Optional worker processes holding solver replicas of the components
+		self.__replicas = Replicas(workers, self.backend) if workers > 1 else None
+
+		self.__grounded = set() if lazy else set(self.grid.cells)
+		for clause in (self.rules.initial() if lazy else self.rules.clauses): self.__rule(clause)
 		
 # Private
-	def __adjacent(self, x, y):
-		cells = [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]
-		return [(i, j) for i, j in cells if 1 <= i <= self.size and 1 <= j <= self.size]
-
-	def __symbol(self, name, x, y):
-		key = (name, x, y)
-		if key not in self.__map:
-			self.__map[key] = len(self.__map) + 1
-		return self.__map[key]
-	
-	def __set_rules(self):
-		cnf = CNF()
-
-		# Define starting position
-		cnf.append([-self.__symbol('P', 1, 1)]) # No pit in (1, 1)
-		cnf.append([-self.__symbol('W', 1, 1)]) # No wumpus in (1, 1)
-		cnf.append([-self.__symbol('G', 1, 1)]) # No gold in (1, 1)
-		cnf.append([-self.__symbol('P_G', 1, 1)]) # No poisonous gas in (1, 1)
-		cnf.append([-self.__symbol('H_P', 1, 1)]) # No health potion in (1, 1)
-
-		# Define rules for breeze, stench, whiff, and glow
-		for x, y in itertools.product(range(1, self.size + 1), repeat=2):
-			stench = self.__symbol('S', x, y)
-			breeze = self.__symbol('B', x, y)
-			whiff = self.__symbol('W_H', x, y)
-			glow = self.__symbol('G_L', x, y)
-
-			adjacent_cells = self.__adjacent(x, y)
-
-			# The percept doesn't exit or one of the adjacent cells must have the property
-			cnf.append([-stench] + [self.__symbol('W', i, j) for i, j in adjacent_cells])
-			cnf.append([-breeze] + [self.__symbol('P', i, j) for i, j in adjacent_cells])
-			cnf.append([-whiff] + [self.__symbol('P_G', i, j) for i, j in adjacent_cells])
-			cnf.append([-glow] + [self.__symbol('H_P', i, j) for i, j in adjacent_cells])
-
-			# If the percept doesn't exist, then none of the adjacent cells have the property
-			for i, j in adjacent_cells:
-				cnf.append([stench, -self.__symbol('W', i, j)])
-				cnf.append([breeze, -self.__symbol('P', i, j)])
-				cnf.append([whiff, -self.__symbol('P_G', i, j)])
-				cnf.append([glow, -self.__symbol('H_P', i, j)])
-
-		return cnf
-	
-	def __reset_solver(self):
-		self.__solver = Glucose3(self.__set_rules())
-		self.__cache.clear()
-		for clause in self.__clauses:
-			self.__solver.add_clause([clause])
+	def __rule(self, clause):
+		self.__propagator.add_clause(clause)
+		self.__dirty = True
+
+	def __ground(self, x, y):
+		# Percept rules only constrain the cells next to a known percept, so
+		# grounding every cell within two steps of a fact gives the same
+		# entailments as the full rule base for every grounded symbol, and
+		# leaves everything further away unknown, as the full rule base would
+		for i in range(max(1, x - 2), min(self.size, x + 2) + 1):
+			for j in range(max(1, y - 2), min(self.size, y + 2) + 1):
+				if abs(i - x) + abs(j - y) > 2 or (i, j) in self.__grounded: continue
+
+				self.__grounded.add((i, j))
+				for clause in self.rules.cell(i, j): self.__rule(clause)
+				self.stats.count('grounded_cells')
+
+	def __decompose(self):
+		if not self.__dirty: return
+		start = self.stats.start()
+		self.__dirty = False
+
+		# Propagation carries on from the last assignment unless a fact was
+		# retracted, and so does the split into components
+		rebuild = self.__retracted
+		if rebuild:
+			self.stats.count('rebuilds')
+			self.__consistent = self.__propagator.reset(self.__clauses)
+		else: self.__consistent = self.__propagator.extend(self.__added)
+		self.__added.clear()
+		self.__retracted = False
+
+		self.__assigned = self.__propagator.assigned
+		if not self.__consistent:
+			# Only a retraction can make the knowledge base consistent again, and
+			# that starts over anyway
+			self.stats.stop('decompose', start)
+			return
+
+		# Only the components holding a newly assigned variable or sharing one
+		# with a newly grounded rule can change; everything else is kept as is
+		clauses = self.__propagator.clauses
+		if rebuild:
+			previous = self.__components
+			self.__components = dict()
+			self.__owner = dict()
+			pending = clauses
+		else:
+			previous = self.__components
+			fresh = clauses[self.__scanned:]
+			affected = {self.__owner[variable] for variable in itertools.islice(self.__assigned, self.__trail, None) if variable in self.__owner}
+			for clause in fresh:
+				for literal in clause:
+					if abs(literal) in self.__owner: affected.add(self.__owner[abs(literal)])
+
+			pending = list(fresh)
+			for component in affected:
+				del self.__components[frozenset(component.clauses)]
+				for variable in component.variables: del self.__owner[variable]
+				pending += component.clauses
+
+		self.__scanned = len(clauses)
+		self.__trail = len(self.__assigned)
+
+		# What is left of each unsatisfied rule, grouped by shared variables
+		remaining = []
+		for clause in pending:
+			reduced = []
+			for literal in clause:
+				value = self.__assigned.get(abs(literal))
+				if value == literal: break
+				if value is None: reduced.append(literal)
+			else: remaining.append(tuple(reduced))
+		groups = self.__split(remaining)
+
+		# A component keeps its solver and entailments until a change touches its clauses
+		for clauses in groups:
+			key = frozenset(clauses)
+			component = previous.get(key)
+			if component is None:
+				component = Component(clauses, self.stats, self.backend)
+				self.stats.count('components_built')
+			else: self.stats.count('components_reused')
+
+			self.__components[key] = component
+			for variable in component.variables: self.__owner[variable] = component
+
+		self.stats.count('components_kept', len(self.__components) - len(groups))
+		self.__consistent = all(component.satisfiable() for component in self.__components.values())
+		self.stats.stop('decompose', start)
+
+	def __split(self, clauses):
+		# Clauses grouped by shared variables, in the order they first appear
+		parent = dict()
+		def find(variable):
+			while parent[variable] != variable:
+				parent[variable] = parent[parent[variable]]
+				variable = parent[variable]
+			return variable
+
+		for clause in clauses:
+			variables = [abs(literal) for literal in clause]
+			for variable in variables: parent.setdefault(variable, variable)
+			root = find(variables[0])
+			for variable in variables[1:]:
+				other = find(variable)
+				if other != root: parent[other] = root
+
+		groups = dict()
+		for clause in clauses: groups.setdefault(find(abs(next(iter(clause)))), []).append(clause)
+		return list(groups.values())
+
+	def __count(self, clauses, weights, memo):
+		# Weighted model count of a monotone CNF, given as a frozenset of
+		# frozensets of variables; variables that drop out of every clause are
+		# free and weigh p + (1 - p) = 1. Independent parts multiply, so a
+		# branch that cuts the formula in two never pays for both halves together
+		if len(clauses) == 0: return 1.0
+		if clauses in memo: return memo[clauses]
+
+		parts = self.__split(clauses)
+		if len(parts) > 1:
+			count = math.prod(self.__count(frozenset(part), weights, memo) for part in parts)
+			memo[clauses] = count
+			return count
+
+		occurrences = dict()
+		for clause in clauses:
+			for variable in clause: occurrences[variable] = occurrences.get(variable, 0) + 1
+		variable = max(occurrences, key = occurrences.get)
+		p = weights[variable]
+
+		count = p * self.__count(frozenset(clause for clause in clauses if variable not in clause), weights, memo)
+		reduced = frozenset(clause - {variable} for clause in clauses)
+		if frozenset() not in reduced: count += (1 - p) * self.__count(reduced, weights, memo)
+
+		memo[clauses] = count
+		return count
+
+	def __marginals(self, clauses, weights):
+		# Chance of each variable being true given that every clause holds
+		variables = set().union(*clauses)
+		if len(variables) > Knowledge.counting_limit:
+			# Each variable takes its largest chance under any one of its clauses
+			# on its own, which at least never drops below its prior
+			self.stats.count('risk_groups_estimated')
+			marginals = {variable: weights[variable] for variable in variables}
+			for clause in clauses:
+				none = math.prod(1 - weights[variable] for variable in clause)
+				for variable in clause: marginals[variable] = max(marginals[variable], weights[variable] / (1 - none))
+			return marginals
+
+		memo = dict()
+		total = self.__count(clauses, weights, memo)
+		if total == 0: return {variable: 1.0 for variable in variables}
+
+		marginals = dict()
+		for variable in variables:
+			rest = frozenset(clause for clause in clauses if variable not in clause)
+			marginals[variable] = weights[variable] * self.__count(rest, weights, memo) / total
+		return marginals
+
+	def __change(self, clause, present):
+		if (clause in self.__clauses) == present: return
+
+		# Remember the state before the first change so a retract-then-assert
+		# of the same literal inside a batch cancels out
+		if self.__changes is not None: self.__changes.setdefault(clause, not present)
+		if present:
+			self.__clauses.add(clause)
+			self.__added.add(clause)
+		else:
+			self.__clauses.remove(clause)
+			self.__retracted = True
+		self.__dirty = True
 	
+	def __literal(self, query):
+		# A query is (property, x, y) or (property, x, y, existence)
+		property, x, y = query[:3]
+		existence = query[3] if len(query) > 3 else True
+		return self.rules.symbol(property, x, y) * (1 if existence else -1)
+
 	def __query(self, clause):
-		if clause in self.__cache: return self.__cache[clause]
-		self.__cache[clause] = not self.__solver.solve(assumptions = [-clause])
-		return self.__cache[clause]
+		# An inconsistent knowledge base entails everything
+		self.__decompose()
+		if not self.__consistent: return True
+
+		# Assigned variables are answered without a component
+		variable = abs(clause)
+		if variable in self.__assigned:
+			self.stats.count('cache_hits')
+			return self.__assigned[variable] == clause
+
+		# Variables outside every component are unconstrained
+		component = self.__owner.get(variable)
+		if component is None:
+			self.stats.count('cache_hits')
+			return False
+		return component.entails(clause)
 	
 # Public
+	def begin(self):
+		if self.__changes is None: self.__changes = dict()
+
+	def commit(self):
+		# Returns whether the batch changed the knowledge base at all
+		changes, self.__changes = self.__changes, None
+		if changes is None: return False
+
+		return any((clause in self.__clauses) != present for clause, present in changes.items())
+
 	def add(self, property, x, y, existence = True):
-		clause = self.__symbol(property, x, y) * (1 if existence else -1)
-		if clause not in self.__clauses: self.__clauses.add(clause)
-		self.__reset_solver()
+		if self.lazy: self.__ground(x, y)
+		clause = self.rules.symbol(property, x, y) * (1 if existence else -1)
+		self.__change(clause, True)
 
 	def remove(self, property, x, y, existence = True):
-		clause = self.__symbol(property, x, y) * (1 if existence else -1)
-		if clause in self.__clauses: self.__clauses.remove(clause)
-		self.__reset_solver()
+		clause = self.rules.symbol(property, x, y) * (1 if existence else -1)
+		self.__change(clause, False)
 
 	def has(self, property, x, y, existence = True):
-		clause = self.__symbol(property, x, y) * (1 if existence else -1)
+		clause = self.rules.symbol(property, x, y) * (1 if existence else -1)
 		return clause in self.__clauses
 
 	# Tin chuan chua anh?
 
+	def query_many(self, queries):
+		# Decides a batch of queries, with every cold literal of every component
+		# worked out on the replicas in parallel and merged back first
+		literals = [self.__literal(query) for query in queries]
+		self.__decompose()
+
+		if self.__replicas is not None and self.__consistent:
+			requests = dict()
+			for literal in literals:
+				component = self.__owner.get(abs(literal))
+				if abs(literal) in self.__assigned or component is None or component.known(literal): continue
+				requests.setdefault(component, []).append(literal)
+
+			start = self.stats.start()
+			for component, answers in self.__replicas.run(requests).items():
+				component.learn(zip(requests[component], answers))
+			self.stats.stop('replicas', start)
+
+		return [self.__query(literal) for literal in literals]
+
+	def fork(self):
+		# A hypothetical child: facts can be added or removed freely without
+		# touching this knowledge base. It shares the rules, the propagation
+		# index until either side grounds more cells, and every component
+		# with its solver and cached answers, so only the components its own
+		# facts touch are ever rebuilt, and those stay with the child
+		self.__decompose()
+		child = Knowledge.__new__(Knowledge)
+		child.size = self.size
+		child.lazy = self.lazy
+		child.solver = self.solver
+		child.backend = self.backend
+		child.priors = self.priors
+		child.stats = Stats(self.stats.enabled)
+		child.rules = self.rules
+		child.grid = self.grid
+		child.percept = self.percept
+		child.properties = self.properties
+
+		child.__clauses = set(self.__clauses)
+		child.__changes = None
+
+		child.__propagator = self.__propagator.fork()
+		child.__added = set()
+		child.__retracted = False
+		child.__dirty = False
+		child.__consistent = self.__consistent
+		child.__assigned = child.__propagator.assigned
+		child.__components = dict(self.__components)
+		child.__owner = dict(self.__owner)
+		child.__scanned = self.__scanned
+		child.__trail = self.__trail
+		child.__risks = dict(self.__risks)
+		child.__replicas = None
+
+		child.__grounded = set(self.__grounded)
+		return child
+
+	def close(self):
+		if self.__replicas is not None: self.__replicas.close()
+		self.__replicas = None
+
 	def certain(self, property, x, y):
-		return self.__query(self.__symbol(property, x, y))
+		return self.__query(self.rules.symbol(property, x, y))
 
 	def impossible(self, property, x, y):
-		return self.__query(-self.__symbol(property, x, y))
+		return self.__query(-self.rules.symbol(property, x, y))
 	
 	def possible(self, property, x, y):
-		if self.impossible(property, x, y):
-			return False
-		
-		adjacent_cells = self.__adjacent(x, y)
-		for i, j in adjacent_cells:
-			if self.certain(self.percept[property], i, j):
-				return True
-			
-		return False
\ No newline at end of file
+		return self.snapshot().possible(property)[(x - 1) * self.size + y - 1]
+
+	def risks(self):
+		# Chance of a pit, wumpus and poisonous gas in every room, as arrays
+		# indexed by (x - 1) * size + (y - 1) like Belief.layer. Percepts of
+		# unvisited rooms are defined by their neighbours, so they sum out of
+		# the count: only the clauses left over from sensed percepts, which
+		# only hold the danger itself, constrain the marginals
+		start = self.stats.start()
+		self.__decompose()
+
+		name = self.rules.name
+		risks = {property: [prior] * (self.size * self.size) for property, prior in self.priors.items()}
+		for variable, literal in self.__assigned.items():
+			property, x, y = name(variable)
+			if property in risks: risks[property][(x - 1) * self.size + y - 1] = 1.0 if literal > 0 else 0.0
+
+		if not self.__consistent:
+			self.stats.stop('risks', start)
+			return risks
+
+		# Frontier clauses grouped by shared variables, across all components
+		frontier = []
+		for component in self.__components.values():
+			for clause in component.clauses:
+				if any(literal < 0 for literal in clause): continue
+				properties = {name(literal)[0] for literal in clause}
+				if len(properties) == 1 and properties <= self.priors.keys(): frontier.append(frozenset(clause))
+
+		memo = dict()
+		for clauses in self.__split(frontier):
+			key = frozenset(clauses)
+			marginals = self.__risks.get(key)
+			if marginals is None:
+				weights = {variable: self.priors[name(variable)[0]] for variable in set().union(*clauses)}
+				marginals = self.__marginals(key, weights)
+				self.stats.count('risk_groups_counted')
+			memo[key] = marginals
+
+			for variable, chance in marginals.items():
+				property, x, y = name(variable)
+				risks[property][(x - 1) * self.size + y - 1] = chance
+
+		self.__risks = memo
+		self.stats.stop('risks', start)
+		return risks
+
+	def snapshot(self):
+		start = self.stats.start()
+		belief = Belief(self.size, self.properties, self.percept)
+		self.__decompose()
+
+		# An inconsistent knowledge base entails everything
+		if not self.__consistent:
+			for property in self.properties:
+				for x, y in self.grid.cells: belief.set(property, x, y, Belief.CERTAIN | Belief.IMPOSSIBLE)
+			self.stats.stop('snapshot', start)
+			return belief
+
+		# Symbols outside the grounded cells are unconstrained, so their belief
+		# stays unknown, and every component only runs its backbone search once
+		cells = self.grid.cells if len(self.__grounded) == len(self.grid.cells) else sorted(self.__grounded)
+
+		# A component whose backbone is already known counts as a hit, one that
+		# needs a backbone search as a miss
+		if self.stats.enabled:
+			for component in self.__components.values():
+				self.stats.count('cache_hits' if component.known() else 'cache_misses')
+
+		if self.__replicas is not None:
+			sent = self.stats.start()
+			requests = {component: None for component in self.__components.values() if not component.known()}
+			for component, backbone in self.__replicas.run(requests).items(): component.learn(backbone)
+			self.stats.stop('replicas', sent)
+
+		for property in self.properties:
+			for x, y in cells:
+				symbol = self.rules.symbol(property, x, y)
+				literal = self.__assigned.get(symbol)
+				if literal is None and symbol in self.__owner: literal = self.__owner[symbol].backbone().get(symbol)
+				if literal is not None: belief.set(property, x, y, Belief.CERTAIN if literal > 0 else Belief.IMPOSSIBLE)
+
+		self.stats.stop('snapshot', start)
+		return belief
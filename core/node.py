@@ -4,7 +4,14 @@
 # =============================================================================
 
 class Node:
-	def __init__(self, state, par, act, dir, score, health, potion):
+	__slots__ = ('state', 'parent', 'action', 'dir', 'score', 'health', 'potion', 'tier')
+
+	# Safety tiers of a search node
+	PURE = 0
+	HARD = 1
+	SOFT = 2
+
+	def __init__(self, state, par, act, dir, score, health, potion, tier = PURE):
 		self.state = state
 		self.parent = par
 		self.action = act
@@ -12,6 +19,7 @@ class Node:
 		self.score = score
 		self.health = health
 		self.potion = potion
+		self.tier = tier
 
 	def __lt__(self, other):
 		if self.score != other.score: return self.score > other.score
@@ -0,0 +1,113 @@
+# propagator.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+class Propagator:
+# Constructor
+	def __init__(self, clauses = ()):
+		self.clauses = []
+		self.occurrences = dict() # literal -> indices of the clauses holding it
+		self.assigned = dict() # variable -> literal
+		self.conflict = False
+		self.__shared = False # clauses and occurrences are shared with a fork
+
+		for clause in clauses: self.add_clause(clause)
+
+# Private
+	def __run(self, queue, assigned):
+		# Assigns every queued literal and whatever becomes unit in turn,
+		# returns False on a conflict
+		while len(queue) > 0:
+			literal = queue.pop()
+			value = assigned.get(abs(literal))
+			if value == literal: continue
+			if value is not None: return False
+			assigned[abs(literal)] = literal
+
+			# Only clauses holding the negation can become unit
+			for index in self.occurrences.get(-literal, ()):
+				free = self.__unit(self.clauses[index], assigned)
+				if free == 0: return False
+				if free is not None: queue.append(free)
+
+		return True
+
+	def __unit(self, clause, assigned):
+		# The last free literal of a clause that is otherwise false, 0 if every
+		# literal is false, None if it is satisfied or has two free literals
+		free = 0
+		for literal in clause:
+			value = assigned.get(abs(literal))
+			if value == literal: return None
+			if value is None:
+				if free != 0: return None
+				free = literal
+		return free
+
+# Public
+	def add_clause(self, clause):
+		# Copy on write, the first clause added after a fork unshares the index
+		if self.__shared:
+			self.clauses = list(self.clauses)
+			self.occurrences = {literal: list(indices) for literal, indices in self.occurrences.items()}
+			self.__shared = False
+
+		index = len(self.clauses)
+		self.clauses.append(clause)
+		for literal in clause: self.occurrences.setdefault(literal, []).append(index)
+
+		# A clause added after propagation may already be unit or false
+		free = self.__unit(clause, self.assigned)
+		if free == 0: self.conflict = True
+		elif free is not None and not self.conflict: self.conflict = not self.__run([free], self.assigned)
+
+	def extend(self, literals):
+		# Incremental: the assignment only grows, so earlier work is kept
+		if not self.conflict: self.conflict = not self.__run(list(literals), self.assigned)
+		return not self.conflict
+
+	def reset(self, literals = ()):
+		# Starts over from the unit clauses, needed once a literal is retracted
+		self.assigned = dict()
+		self.conflict = False
+		return self.extend([clause[0] for clause in self.clauses if len(clause) == 1] + list(literals))
+
+	def fork(self):
+		# Shares the clauses until either side adds one, only the assignment is copied
+		child = Propagator()
+		child.clauses = self.clauses
+		child.occurrences = self.occurrences
+		child.assigned = dict(self.assigned)
+		child.conflict = self.conflict
+		child.__shared = self.__shared = True
+		return child
+
+	def complete(self, variables, literals = (), phases = None):
+		# Looks for a model without search: after propagating the literals,
+		# every free variable is decided in turn, preferring its phase, and
+		# propagated; a decision conflicting both ways gives up instead of
+		# backtracking. Returns the model as variable -> literal or None
+		if self.conflict: return None
+		assigned = dict(self.assigned)
+		if not self.__run(list(literals), assigned): return None
+
+		phases = phases or dict()
+		for variable in variables:
+			if variable in assigned: continue
+			literal = phases.get(variable, -variable)
+
+			# Assignments only ever get appended, so undoing one pops them off the end
+			mark = len(assigned)
+			if self.__run([literal], assigned): continue
+			while len(assigned) > mark: assigned.popitem()
+			if not self.__run([-literal], assigned): return None
+
+		return assigned
+
+	def probe(self, literals):
+		# Propagates on top of the current assignment without keeping anything,
+		# returns the extended assignment or None on a conflict
+		if self.conflict: return None
+		assigned = dict(self.assigned)
+		return assigned if self.__run(list(literals), assigned) else None
@@ -0,0 +1,98 @@
+# replicas.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+import multiprocessing
+import weakref
+
+from .component import Component
+from .stats import Stats
+
+class Replicas:
+# Constructor
+	def __init__(self, workers, backend):
+		# Every component is pinned to one worker, which keeps its replica (and
+		# the replica's learnt clauses and models) loaded across batches
+		self.workers = []
+		for _ in range(workers):
+			connection, remote = multiprocessing.Pipe()
+			process = multiprocessing.Process(target = Replicas.serve, args = (remote, backend), daemon = True)
+			process.start()
+			remote.close()
+			self.workers.append((process, connection))
+
+		self.__ids = weakref.WeakKeyDictionary() # component -> replica id
+		self.__top = 0
+		self.__forgotten = [[] for _ in range(workers)]
+
+# Private
+	def __id(self, component):
+		# Returns the replica id and whether the worker has yet to load it
+		if component in self.__ids: return self.__ids[component], False
+		self.__top += 1
+		self.__ids[component] = self.__top
+
+		# Once the component is gone its replica is dropped with the next batch
+		shard = self.__forgotten[self.__top % len(self.workers)]
+		weakref.finalize(component, shard.append, self.__top)
+		return self.__top, True
+
+# Public
+	@staticmethod
+	def serve(connection, backend):
+		replicas = dict()
+		stats = Stats()
+		while True:
+			message = connection.recv()
+			if message is None: break
+
+			forgotten, batch = message
+			for replica in forgotten: replicas.pop(replica, None)
+
+			answers = []
+			for replica, clauses, literals in batch:
+				if clauses is not None: replicas[replica] = Component(clauses, stats, backend)
+				component = replicas[replica]
+				if literals is None: answers.append(component.backbone())
+				else: answers.append([component.entails(literal) for literal in literals])
+			connection.send(answers)
+
+		connection.close()
+
+	def run(self, requests):
+		# Requests map components to the literals to decide, or to None for the
+		# whole backbone; batches go out to every worker before any answer is read
+		batches = [[] for _ in self.workers]
+		order = [[] for _ in self.workers]
+		for component, literals in requests.items():
+			replica, fresh = self.__id(component)
+			shard = replica % len(self.workers)
+			batches[shard].append((replica, component.clauses if fresh else None, literals))
+			order[shard].append(component)
+
+		busy = []
+		for shard, batch in enumerate(batches):
+			if len(batch) == 0: continue
+			# Drained in place, the finalizers of live components still append to this list
+			forgotten = list(self.__forgotten[shard])
+			self.__forgotten[shard].clear()
+			self.workers[shard][1].send((forgotten, batch))
+			busy.append(shard)
+
+		answers = dict()
+		for shard in busy:
+			for component, answer in zip(order[shard], self.workers[shard][1].recv()):
+				answers[component] = answer
+		return answers
+
+	def pending(self):
+		# Replicas of collected components that no worker has dropped yet
+		return sum(len(forgotten) for forgotten in self.__forgotten)
+
+	def close(self):
+		for process, connection in self.workers:
+			connection.send(None)
+			connection.close()
+			process.join()
+		self.workers = []
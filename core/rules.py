@@ -0,0 +1,134 @@
+# rules.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+import os
+
+from .grid import Grid
+
+class Rules:
+	__compiled = dict() # Process-wide cache, keyed by grid size
+
+	# Saved rule files from another version are rebuilt, bump it whenever the
+	# variable layout or the rules change
+	version = 1
+
+	# Variables are laid out property-major: property index * N^2 + cell index + 1
+	properties = ['P', 'W', 'G', 'P_G', 'H_P', 'S', 'B', 'W_H', 'G_L']
+	offsets = {property: i for i, property in enumerate(properties)}
+
+# Constructor
+	def __init__(self, size, clauses = None):
+		self.size = size
+		self.area = size * size
+		self.grid = Grid.of(size)
+		self.clauses = []
+		self.variables = len(Rules.properties) * self.area
+
+		if clauses is None: self.__set_rules()
+		else: self.clauses = clauses
+
+# Private
+	def __set_rules(self):
+		self.clauses += self.initial()
+		for x, y in self.grid.cells:
+			self.clauses += self.cell(x, y)
+
+# Public
+	def symbol(self, name, x, y):
+		return Rules.offsets[name] * self.area + (x - 1) * self.size + y
+
+	def name(self, variable):
+		# Inverse of symbol, as (name, x, y)
+		property, index = divmod(variable - 1, self.area)
+		return Rules.properties[property], index // self.size + 1, index % self.size + 1
+
+	def initial(self):
+		# Define starting position
+		symbol = self.symbol
+		return [
+			[-symbol('P', 1, 1)], # No pit in (1, 1)
+			[-symbol('W', 1, 1)], # No wumpus in (1, 1)
+			[-symbol('G', 1, 1)], # No gold in (1, 1)
+			[-symbol('P_G', 1, 1)], # No poisonous gas in (1, 1)
+			[-symbol('H_P', 1, 1)] # No health potion in (1, 1)
+		]
+
+	def cell(self, x, y):
+		# Define rules for breeze, stench, whiff, and glow in one cell, so lazy
+		# knowledge bases can ground it on its own
+		symbol = self.symbol
+		cnf = []
+		stench = symbol('S', x, y)
+		breeze = symbol('B', x, y)
+		whiff = symbol('W_H', x, y)
+		glow = symbol('G_L', x, y)
+
+		adjacent_cells = self.grid.around(x, y)
+
+		# The percept doesn't exit or one of the adjacent cells must have the property
+		cnf.append([-stench] + [symbol('W', i, j) for i, j in adjacent_cells])
+		cnf.append([-breeze] + [symbol('P', i, j) for i, j in adjacent_cells])
+		cnf.append([-whiff] + [symbol('P_G', i, j) for i, j in adjacent_cells])
+		cnf.append([-glow] + [symbol('H_P', i, j) for i, j in adjacent_cells])
+
+		# If the percept doesn't exist, then none of the adjacent cells have the property
+		for i, j in adjacent_cells:
+			cnf.append([stench, -symbol('W', i, j)])
+			cnf.append([breeze, -symbol('P', i, j)])
+			cnf.append([whiff, -symbol('P_G', i, j)])
+			cnf.append([glow, -symbol('H_P', i, j)])
+
+		return cnf
+
+	@classmethod
+	def compile(cls, size, directory = None):
+		# Rules only depend on the grid size, so each size is built (or loaded)
+		# once per process and shared by every Knowledge instance. A given
+		# directory always ends up holding them, even when they were compiled
+		# earlier without it
+		path = None if directory is None else os.path.join(directory, f"rules_{size}.cnf")
+		current = path is not None and cls.header(path) == (cls.version, size)
+
+		rules = cls.__compiled.get(size)
+		if rules is None:
+			rules = cls.load(path) if current else cls(size)
+			cls.__compiled[size] = rules
+
+		# Missing, or written for another size or an older layout
+		if path is not None and not current: rules.save(path)
+		return rules
+
+	@classmethod
+	def header(cls, path):
+		# (version, size) from the comments of a saved file, None if missing
+		if not os.path.exists(path): return None
+		version, size = None, 0
+		with open(path, 'r') as file:
+			for line in file:
+				if not line.startswith('c'): break
+				if line.startswith('c version'): version = int(line.split()[2])
+				elif line.startswith('c size'): size = int(line.split()[2])
+		return version, size
+
+	def save(self, path):
+		# DIMACS CNF, with the layout version and grid size stored as comments
+		os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+		with open(path, 'w') as file:
+			file.write(f"c version {Rules.version}\n")
+			file.write(f"c size {self.size}\n")
+
+			file.write(f"p cnf {self.variables} {len(self.clauses)}\n")
+			for clause in self.clauses:
+				file.write(' '.join(map(str, clause)) + " 0\n")
+
+	@classmethod
+	def load(cls, path):
+		# None if the file was saved by another version
+		version, size = cls.header(path)
+		if version != cls.version: return None
+
+		with open(path, 'r') as file:
+			clauses = [[int(literal) for literal in line.split()[:-1]] for line in file if line.strip() and line[0] not in 'cp']
+		return cls(size, clauses)
@@ -0,0 +1,40 @@
+# stats.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+import time
+
+class Stats:
+# Constructor
+	def __init__(self, enabled = False):
+		# Disabled stats ignore every call after a single flag check
+		self.enabled = enabled
+		self.counters = dict()
+		self.timers = dict() # name -> [calls, total seconds, slowest call]
+		self.samples = dict() # name -> every timed value, for percentiles
+
+# Public
+	def count(self, name, amount = 1):
+		if self.enabled: self.counters[name] = self.counters.get(name, 0) + amount
+
+	def start(self):
+		return time.perf_counter() if self.enabled else 0.0
+
+	def stop(self, name, start, sample = False):
+		if not self.enabled: return
+		elapsed = time.perf_counter() - start
+
+		timer = self.timers.setdefault(name, [0, 0.0, 0.0])
+		timer[0] += 1
+		timer[1] += elapsed
+		timer[2] = max(timer[2], elapsed)
+		if sample: self.samples.setdefault(name, []).append(elapsed)
+
+	def as_dict(self):
+		return {
+			'counters': dict(self.counters),
+			'timers': {name: {'calls': calls, 'total': total, 'max': slowest} for name, (calls, total, slowest) in self.timers.items()},
+			'samples': {name: list(values) for name, values in self.samples.items()},
+		}
+
@@ -0,0 +1,106 @@
+# trace.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+import hashlib
+import struct
+
+from .world import World
+
+class Trace:
+	MAGIC = b'WUMT'
+	VERSION = 1
+
+	# Magic, version, grid size, SHA-1 of the map text and its length in bytes
+	header = struct.Struct('<4sBH20sI')
+
+	# Move, percept bits, then the score and health right after the move
+	step = struct.Struct('<BHih')
+
+	# Code 0 stands for a missing or unknown move, which ends the episode
+	moves = [None, 'F', 'L', 'R', 'G', 'S', 'C', 'H']
+
+# Constructor
+	def __init__(self, text, steps = None):
+		# The map itself is stored so a replay needs nothing but the trace
+		self.text = text
+		self.size = int(text.split('\n', 1)[0].strip())
+		self.digest = hashlib.sha1(text.encode()).digest()
+		self.steps = bytearray(steps or b'')
+		self.__file = None
+
+	@classmethod
+	def from_map(cls, filename):
+		# A new, empty trace of the map in a text file, see load for trace files
+		with open(filename, 'r') as file:
+			return cls(file.read())
+
+	@classmethod
+	def load(cls, path):
+		with open(path, 'rb') as file:
+			data = file.read()
+
+		if len(data) < cls.header.size:
+			raise ValueError(f"{path} is too short to be a trace")
+
+		magic, version, size, digest, length = cls.header.unpack_from(data)
+		if magic != cls.MAGIC or version != cls.VERSION:
+			raise ValueError(f"{path} is not a version {cls.VERSION} trace")
+
+		start = cls.header.size + length
+		trace = cls(data[cls.header.size : start].decode(), data[start:])
+		if trace.digest != digest or trace.size != size:
+			raise ValueError(f"{path} holds a corrupted map")
+
+		# A run that died mid-write may leave a partial record behind
+		del trace.steps[len(trace.steps) - len(trace.steps) % cls.step.size:]
+		return trace
+
+# Private
+	def __encode_move(self, move):
+		return Trace.moves.index(move) if move in Trace.moves else 0
+
+	def __encode_percepts(self, percepts):
+		bits = 0
+		for item in percepts:
+			if item in World.properties: bits |= 1 << World.properties.index(item)
+		return bits
+
+	def __decode_percepts(self, bits):
+		return [item for i, item in enumerate(World.properties) if bits >> i & 1]
+
+# Public
+	def world(self):
+		return World.parse(self.text)
+
+	def open(self, path):
+		# Steps recorded from now on are appended to the file as they happen
+		self.close()
+		self.__file = open(path, 'wb')
+		text = self.text.encode()
+		self.__file.write(Trace.header.pack(Trace.MAGIC, Trace.VERSION, self.size, self.digest, len(text)))
+		self.__file.write(text)
+		self.__file.write(self.steps)
+
+	def close(self):
+		if self.__file is not None:
+			self.__file.close()
+			self.__file = None
+
+	def save(self, path):
+		self.open(path)
+		self.close()
+
+	def record(self, move, percepts, score, health):
+		packed = Trace.step.pack(self.__encode_move(move), self.__encode_percepts(percepts), score, health)
+		self.steps += packed
+		if self.__file is not None: self.__file.write(packed)
+
+	def __len__(self):
+		return len(self.steps) // Trace.step.size
+
+	def __getitem__(self, index):
+		if not 0 <= index < len(self): raise IndexError("trace step out of range")
+		move, percepts, score, health = Trace.step.unpack_from(self.steps, index * Trace.step.size)
+		return Trace.moves[move], self.__decode_percepts(percepts), score, health
@@ -0,0 +1,168 @@
+# world.py
+# =============================================================================
+#  Description to be updated.
+# =============================================================================
+
+from array import array
+
+from .grid import Grid
+
+class World:
+	actions = {
+		'F': "Forward",
+		'L': "Turn Left",
+		'R': "Turn Right",
+		'G': "Grab",
+		'S': "Shoot Arrow",
+		'C': "Exit the Cave",
+		'H': "Heal"
+	}
+
+	signals = {
+		'W': 'S',
+		'P': 'B',
+		'P_G': 'W_H',
+		'H_P': 'G_L'
+	}
+
+	properties = ['S', 'B', 'W_H', 'G_L', 'W', 'P', 'G', 'P_G', 'H_P']
+
+	# One bit per element a room can hold, in the order rooms list them
+	elements = ['A', 'W', 'P', 'G', 'P_G', 'H_P', 'S', 'B', 'W_H', 'G_L']
+	bits = {element: 1 << i for i, element in enumerate(elements)}
+
+	# Row and column offsets, indexed by the direction names used by the GUI
+	directions = {
+		"up": (-1, 0),
+		"down": (1, 0),
+		"left": (0, -1),
+		"right": (0, 1)
+	}
+
+	__decoded = dict() # bits -> room contents, shared by every world
+
+# Constructor
+	def __init__(self, size, rooms):
+		self.size = size
+
+		# Each room is a bitmask of its elements, a signal bit stays set while
+		# its count of adjacent sources is above zero
+		self.cells = array('H', [0]) * (size * size)
+		self.counts = {signal: array('B', [0]) * (size * size) for signal in World.signals.values()}
+		self.adjacent = Grid.of(size).neighbours
+
+		self.position = (size - 1, 0)
+		self.direction = "right"
+		self.done = False
+
+		for i in range(size):
+			for j in range(size):
+				for element in rooms[i][j].split():
+					if element in World.bits: self.__place(i * size + j, element)
+
+	@classmethod
+	def read(cls, filename):
+		with open(filename, 'r') as file:
+			return cls.parse(file.read())
+
+	@classmethod
+	def parse(cls, text):
+		lines = text.split('\n')
+		N = int(lines[0].strip())
+		rooms = [lines[i].strip().split('.') for i in range(1, N + 1)]
+		return cls(N, rooms)
+
+# Private
+	def __place(self, index, element):
+		self.cells[index] |= World.bits[element]
+
+		# Add Stench (S) for Wumpus (W), Breeze (B) for Pit (P), Whiff (W_H)
+		# for Poisonous Gas (P_G) and Glow (G_L) for Healing Potions (H_P)
+		signal = World.signals.get(element)
+		if signal is None: return
+
+		count = self.counts[signal]
+		for neighbour in self.adjacent[index]:
+			count[neighbour] += 1
+			self.cells[neighbour] |= World.bits[signal]
+
+	def __take(self, index, element):
+		if not self.cells[index] & World.bits[element]: return False
+		self.cells[index] &= ~World.bits[element]
+
+		# A signal only fades from rooms no other source is adjacent to
+		signal = World.signals.get(element)
+		if signal is not None:
+			count = self.counts[signal]
+			for neighbour in self.adjacent[index]:
+				count[neighbour] -= 1
+				if count[neighbour] == 0: self.cells[neighbour] &= ~World.bits[signal]
+
+		return True
+
+	def __decode(self, bits):
+		contents = World.__decoded.get(bits)
+		if contents is None:
+			contents = tuple(element for element in World.elements if bits & World.bits[element])
+			World.__decoded[bits] = contents
+		return contents
+
+# Public
+	def room(self, i, j):
+		return list(self.__decode(self.cells[i * self.size + j]))
+
+	def percepts(self, position = None):
+		i, j = self.position if position is None else position
+		return [item for item in self.__decode(self.cells[i * self.size + j]) if item != 'A']
+
+	def describe(self, move):
+		# Log line in the testcase output format, with (1, 1) at the bottom left
+		output_x = self.size - int(self.position[0])
+		output_y = int(self.position[1]) + 1
+		return "(" + str(output_x) + "," + str(output_y) + "): " + World.actions.get(move, "Unknown Action")
+
+	def forward(self):
+		x, y = self.position
+		dx, dy = World.directions[self.direction]
+		if 0 <= x + dx < self.size and 0 <= y + dy < self.size:
+			self.position = (x + dx, y + dy)
+
+	def turn_left(self):
+		directions = ["up", "left", "down", "right"]
+		current_idx = directions.index(self.direction)
+		self.direction = directions[(current_idx + 1) % 4]
+
+	def turn_right(self):
+		directions = ["up", "right", "down", "left"]
+		current_idx = directions.index(self.direction)
+		self.direction = directions[(current_idx + 1) % 4]
+
+	def grab(self):
+		x, y = self.position
+		index = x * self.size + y
+		self.__take(index, 'G')
+		self.__take(index, 'H_P')
+
+	def shoot(self):
+		x, y = self.position
+		dx, dy = World.directions[self.direction]
+		target_x, target_y = x + dx, y + dy
+		if not (0 <= target_x < self.size and 0 <= target_y < self.size):
+			return False # No valid target
+
+		# True when a wumpus was killed
+		return self.__take(target_x * self.size + target_y, 'W')
+
+	def climb(self):
+		self.done = True
+
+	def act(self, move):
+		# Applies a move and returns whether it killed the wumpus
+		if move not in World.actions: self.done = True
+		elif move == 'F': self.forward()
+		elif move == 'L': self.turn_left()
+		elif move == 'R': self.turn_right()
+		elif move == 'G': self.grab()
+		elif move == 'S': return self.shoot()
+		elif move == 'C': self.climb()
+		return False
@@ -0,0 +1,110 @@
+# evaluate.py
+# =============================================================================
+#  Runs the agent headlessly over a directory of testcase maps.
+# =============================================================================
+
+import argparse
+import difflib
+import glob
+import json
+import multiprocessing
+import os
+import time
+
+from core import Agent, Generator, Trace
+
+def percentile(values, q):
+	if len(values) == 0: return 0.0
+	ordered = sorted(values)
+	return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+def run(path, limit = 1000, stats = None, traces = None, priors = None):
+	trace = Trace.from_map(path)
+	world = trace.world()
+	agent = Agent(world.size, profile = stats is not None, priors = priors)
+
+	name = os.path.splitext(os.path.basename(path))[0]
+	if traces is not None:
+		os.makedirs(traces, exist_ok = True)
+		trace.open(os.path.join(traces, name + ".trace"))
+
+	steps = []
+	latencies = []
+	start = time.perf_counter()
+
+	while not world.done and len(steps) < limit:
+		tick = time.perf_counter()
+		percepts = world.percepts()
+		move = agent.move(percepts)
+		latencies.append(time.perf_counter() - tick)
+		trace.record(move, percepts, agent.score, agent.health)
+
+		steps.append(world.describe(move))
+		world.act(move)
+
+	wall = time.perf_counter() - start
+	trace.close()
+
+	if stats is not None:
+		os.makedirs(stats, exist_ok = True)
+		with open(os.path.join(stats, name + ".json"), 'w') as file:
+			json.dump(dict(agent.report(), map = os.path.basename(path), steps = len(steps), wall = wall), file, indent = 1)
+
+	# Compare against the matching output_*.txt, if there is one
+	expected = os.path.join(os.path.dirname(path), os.path.basename(path).replace("input", "output"))
+	diff = None
+	if os.path.exists(expected):
+		with open(expected, 'r') as file:
+			reference = [line.rstrip('\n') for line in file if line.strip()]
+		diff = list(difflib.unified_diff(reference, steps, expected, "agent", lineterm = ""))
+
+	return {
+		'map': os.path.basename(path),
+		'score': agent.score,
+		'health': agent.health,
+		'steps': len(steps),
+		'wall': wall,
+		'p50': percentile(latencies, 50),
+		'p90': percentile(latencies, 90),
+		'p99': percentile(latencies, 99),
+		'diff': diff,
+	}
+
+def evaluate(job):
+	return run(*job)
+
+def main():
+	parser = argparse.ArgumentParser(description = "Run the agent over testcase maps without the GUI.")
+	parser.add_argument("directory", nargs = "?", default = "testcase", help = "directory holding input_*.txt maps")
+	parser.add_argument("-j", "--workers", type = int, default = os.cpu_count(), help = "number of worker processes")
+	parser.add_argument("-n", "--limit", type = int, default = 1000, help = "maximum number of steps per map")
+	parser.add_argument("-d", "--diff", action = "store_true", help = "print the action trace diff of mismatching maps")
+	parser.add_argument("-t", "--trace", metavar = "DIRECTORY", help = "record every episode as a binary trace here, for replay in the GUI")
+	parser.add_argument("-s", "--stats", metavar = "DIRECTORY", help = "profile every episode and dump its stats as JSON here")
+	parser.add_argument("--pit", type = float, default = Generator.defaults['P'], help = "pit density the maps were generated with")
+	parser.add_argument("--wumpus", type = float, default = Generator.defaults['W'], help = "wumpus density the maps were generated with")
+	parser.add_argument("--gas", type = float, default = Generator.defaults['P_G'], help = "poisonous gas density the maps were generated with")
+	args = parser.parse_args()
+
+	priors = {'P': args.pit, 'W': args.wumpus, 'P_G': args.gas}
+	paths = sorted(glob.glob(os.path.join(args.directory, "input_*.txt")))
+	jobs = [(path, args.limit, args.stats, args.trace, priors) for path in paths]
+
+	# Every worker builds its own Agent, and with it its own Knowledge and solver
+	with multiprocessing.Pool(max(1, min(args.workers, len(jobs)))) as pool:
+		results = pool.map(evaluate, jobs)
+
+	print(f"{'map':<16}{'score':>8}{'health':>8}{'steps':>7}{'wall(s)':>9}{'p50(ms)':>9}{'p90(ms)':>9}{'p99(ms)':>9}  trace")
+	for result in results:
+		if result['diff'] is None: trace = "no reference"
+		elif len(result['diff']) == 0: trace = "match"
+		else: trace = "differs"
+
+		print(f"{result['map']:<16}{result['score']:>8}{result['health']:>8}{result['steps']:>7}"
+			f"{result['wall']:>9.2f}{result['p50'] * 1000:>9.2f}{result['p90'] * 1000:>9.2f}{result['p99'] * 1000:>9.2f}  {trace}")
+
+		if args.diff and result['diff']:
+			print('\n'.join(result['diff']))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,29 @@
+# generate.py
+# =============================================================================
+#  Writes seeded random maps in the testcase input format.
+# =============================================================================
+
+import argparse
+import os
+
+from core import Generator
+
+def main():
+	parser = argparse.ArgumentParser(description = "Generate random Wumpus world maps.")
+	parser.add_argument("size", type = int, help = "width and height of the grid")
+	parser.add_argument("-c", "--count", type = int, default = 1, help = "number of maps to generate")
+	parser.add_argument("-s", "--seed", type = int, default = 0, help = "seed of the first map, later maps use seed + index")
+	parser.add_argument("-o", "--directory", default = "maps", help = "directory the input_*.txt maps are written to")
+	parser.add_argument("--pit", type = float, default = Generator.defaults['P'], help = "probability of a room holding a pit")
+	parser.add_argument("--wumpus", type = float, default = Generator.defaults['W'], help = "probability of a room holding a wumpus")
+	parser.add_argument("--gas", type = float, default = Generator.defaults['P_G'], help = "probability of a room holding poisonous gas")
+	parser.add_argument("--potion", type = float, default = Generator.defaults['H_P'], help = "probability of a room holding a healing potion")
+	parser.add_argument("--gold", type = float, default = Generator.defaults['G'], help = "probability of a room holding gold")
+	args = parser.parse_args()
+
+	for index in range(1, args.count + 1):
+		generator = Generator(args.seed + index - 1, args.pit, args.wumpus, args.gas, args.potion, args.gold)
+		generator.write(os.path.join(args.directory, f"input_{index}.txt"), args.size)
+
+if __name__ == "__main__":
+	main()
@@ -4,7 +4,8 @@ import os
 from tkinter import filedialog
 import tkinter.messagebox as messagebox
 
-from core import Agent
+from core import Trace, World
+from .worker import Worker
 
 class Program:
     def __init__(self, root):
@@ -15,7 +16,11 @@ class Program:
         self.root.title("Wumpus World")
         self.health = 100
         self.score = 0
-        self.world_map = []
+        self.world = None
+        self.trace = None  # Episode being recorded from the live agent
+        self.replay = None  # Loaded trace, set only while in replay mode
+        self.replay_step = 0
+        self.dirty = set()  # Cells to redraw on the next map update
         self.N = 10
         self.logic_steps = []
         self.loaded_map_file = ""
@@ -23,14 +28,14 @@ class Program:
         self.smoke_image = tk.PhotoImage(file="image/smoke-png-525.png").subsample(5, 5)
         self.smoke_coverage = [[True for _ in range(self.N)] for _ in range(self.N)]
 
-        initial_x, initial_y = 9, 0
+        initial_x, initial_y = self.N - 1, 0
         self.smoke_coverage[initial_x][initial_y] = False
 
-        self.agent_position = (9, 0)
-        self.agent_direction = "right"
-
-        # Initialize the Agent
-        self.agent = Agent()
+        # The agent runs in a worker thread per map, the Tk loop only polls its moves
+        self.worker = None
+        self.pending = 0  # Next Step presses still waiting for a move
+        self.poll_id = None
+        self.poll_interval = 10  # Milliseconds between polls while no move is ready
 
         # Load the agent images for each direction
         self.agent_images = {
@@ -53,6 +58,9 @@ class Program:
         load_button = tk.Button(menu_frame, text="Load Map", command=self.load_map)
         load_button.pack(side="left", padx=5, pady=5)
 
+        trace_button = tk.Button(menu_frame, text="Load Trace", command=self.load_trace)
+        trace_button.pack(side="left", padx=5, pady=5)
+
     def create_map_frame(self):
         self.map_frame = tk.Frame(self.root)
         self.map_frame.pack(side="left", padx=5, pady=5)
@@ -81,6 +89,17 @@ class Program:
         self.score_label = tk.Label(control_frame, text=f"Score: {self.score}")
         self.score_label.pack(pady=5)
 
+        # Milliseconds between steps while running, for both live runs and replays
+        speed_scale = tk.Scale(control_frame, label="Interval (ms)", from_=1, to=1000, orient="horizontal",
+                               command=self.set_interval)
+        speed_scale.set(self.run_interval)
+        speed_scale.pack(pady=5)
+
+        # Scrubs through a loaded trace, only active in replay mode
+        self.replay_scale = tk.Scale(control_frame, label="Replay step", from_=0, to=0, orient="horizontal",
+                                     command=lambda value: self.seek(int(value)), state="disabled")
+        self.replay_scale.pack(pady=5)
+
     def create_logic_frame(self):
         # Frame for propositional logic steps
         self.logic_frame = tk.Frame(self.root)
@@ -119,14 +138,24 @@ class Program:
         file_path = filedialog.askopenfilename(title="Select Map File", filetypes=[("Text Files", "*.txt")])
         if file_path:
             self.loaded_map_file = file_path
+            self.pause_agent()
+            # Load the new map, the grid size comes from the file
+            self.trace = Trace.from_map(file_path)
+            self.world = self.trace.world()
+            self.N = self.world.size
+            self.replay = None
+            self.replay_scale.config(to=0, state="disabled")
+
             # Reset game state
             self.health = 100
             self.score = 0
-            self.agent_position = (9, 0)
-            self.agent_direction = "right"
             self.smoke_coverage = [[True for _ in range(self.N)] for _ in range(self.N)]
-            self.smoke_coverage[9][0] = False  # Uncover the initial position
-            self.agent = Agent()  # Reset the agent
+            initial_x, initial_y = self.world.position
+            self.smoke_coverage[initial_x][initial_y] = False  # Uncover the initial position
+            # Reset the agent, it starts deciding moves right away on its own copy of the world
+            self.stop_worker()
+            self.worker = Worker(self.trace.text)
+            self.worker.start()
             self.logic_steps = []
             self.current_step = 0
             self.text_position = 10  # Reset text position in logic frame
@@ -136,9 +165,6 @@ class Program:
             for widget in self.text_frame.winfo_children():
                 widget.destroy()
 
-            # Load the new map
-            self.N, self.world_map = self.read_map(file_path)
-            self.add_signals()
             self.display_map()
 
             # Update health and score labels
@@ -152,101 +178,88 @@ class Program:
             self.root.after(100, self.sync_logic_frame_size)  # Adjust timing as needed
 
 
-    def read_map(self, filename):
-        with open(filename, 'r') as file:
-            N = int(file.readline().strip())
-            world_map = [file.readline().strip().split('.') for _ in range(N)]
-        return N, world_map
-
-    def add_signals(self):
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
-
-        for i in range(self.N):
-            for j in range(self.N):
-                room = self.world_map[i][j]
-
-                if '-' in room:
-                    room = room.replace('-', '')
-                    self.world_map[i][j] = room
-
-                # Add Stench (S) for Wumpus (W)
-                if 'W' in room.split():
-                    for di, dj in directions:
-                        ni, nj = i + di, j + dj
-                        if 0 <= ni < self.N and 0 <= nj < self.N:
-                            if 'S' not in self.world_map[ni][nj]:
-                                self.world_map[ni][nj] += " S"
-
-                # Add Breeze (B) for Pit (P)
-                if 'P' in room.split():
-                    for di, dj in directions:
-                        ni, nj = i + di, j + dj
-                        if 0 <= ni < self.N and 0 <= nj < self.N:
-                            if 'B' not in self.world_map[ni][nj]:
-                                self.world_map[ni][nj] += " B"
-
-                # Add Whiff (W_H) for Poisonous Gas (P_G)
-                if 'P_G' in room.split():
-                    for di, dj in directions:
-                        ni, nj = i + di, j + dj
-                        if 0 <= ni < self.N and 0 <= nj < self.N:
-                            if 'W_H' not in self.world_map[ni][nj]:
-                                self.world_map[ni][nj] += " W_H"
-
-                # Add Glow (G_L) for Healing Potions (H_P)
-                if 'H_P' in room.split():
-                    for di, dj in directions:
-                        ni, nj = i + di, j + dj
-                        if 0 <= ni < self.N and 0 <= nj < self.N:
-                            if 'G_L' not in self.world_map[ni][nj]:
-                                self.world_map[ni][nj] += " G_L"
-
     def display_map(self):
+        # Full rebuild, only needed when a map or trace is loaded or a replay rewinds
         self.canvas.delete("all")  # Clear the canvas
+        self.dirty = set()
 
-        cell_size = 65  # Increased size of each cell
-        font_size = 8  # Adjust the font size as needed
-        width = self.N * cell_size
-        height = self.N * cell_size
+        self.cell_size = max(8, min(65, 650 // self.N))  # Shrink cells so large maps still fit
+        width = self.N * self.cell_size
+        height = self.N * self.cell_size
         self.canvas.config(width=width, height=height)
 
         for i in range(self.N):
             for j in range(self.N):
-                x1, y1 = j * cell_size, i * cell_size
-                x2, y2 = x1 + cell_size, y1 + cell_size
-                room_content = self.world_map[i][j].split()
+                x1, y1 = j * self.cell_size, i * self.cell_size
+                x2, y2 = x1 + self.cell_size, y1 + self.cell_size
 
-                # Draw the rectangle
+                # The rectangle stays for the whole map, only the contents are redrawn
                 self.canvas.create_rectangle(x1, y1, x2, y2, outline="black", fill="white")
+                self.draw_cell(i, j)
 
-                # Draw the agent image at its current position with the correct direction
-                if (i, j) == self.agent_position:
-                    self.canvas.create_image(
-                        (x1 + x2) / 2, 
-                        (y1 + y2) / 2, 
-                        image=self.agent_images[self.agent_direction]
-                    )
+    def draw_cell(self, i, j):
+        # Every item inside a cell shares one tag, so a cell is redrawn without touching the others
+        tag = f"cell_{i}_{j}"
+        self.canvas.delete(tag)
 
-                # Draw each signal separately with its corresponding color
-                if room_content:
-                    y_offset = y1 + 10  # Start position for text in the cell
-                    for symbol in room_content:
-                        if symbol != 'A':  # Skip drawing 'A' as text
-                            self.canvas.create_text(
-                                (x1 + x2) / 2, y_offset, 
-                                text=symbol, 
-                                fill=self.color_map(symbol), 
-                                font=("Arial", font_size)
-                            )
-                            y_offset += font_size + 5  # Move to the next line for the next symbol
-
-                # Draw the smoke image if the cell is still covered by smoke
-                if self.smoke_coverage[i][j]:
-                    self.canvas.create_image(
-                        (x1 + x2) / 2, 
-                        (y1 + y2) / 2, 
-                        image=self.smoke_image
+        font_size = 8  # Adjust the font size as needed
+        x1, y1 = j * self.cell_size, i * self.cell_size
+        x2, y2 = x1 + self.cell_size, y1 + self.cell_size
+        room_content = self.world.room(i, j)
+
+        # Draw the agent image at its current position with the correct direction
+        if (i, j) == self.world.position:
+            self.canvas.create_image(
+                (x1 + x2) / 2, 
+                (y1 + y2) / 2, 
+                image=self.agent_images[self.world.direction],
+                tags=tag
+            )
+
+        # Draw each signal separately with its corresponding color
+        if room_content:
+            y_offset = y1 + 10  # Start position for text in the cell
+            for symbol in room_content:
+                if symbol != 'A':  # Skip drawing 'A' as text
+                    self.canvas.create_text(
+                        (x1 + x2) / 2, y_offset, 
+                        text=symbol, 
+                        fill=self.color_map(symbol), 
+                        font=("Arial", font_size),
+                        tags=tag
                     )
+                    y_offset += font_size + 5  # Move to the next line for the next symbol
+
+        # Draw the smoke image if the cell is still covered by smoke
+        if self.smoke_coverage[i][j]:
+            self.canvas.create_image(
+                (x1 + x2) / 2, 
+                (y1 + y2) / 2, 
+                image=self.smoke_image,
+                tags=tag
+            )
+
+    def mark_move(self, move):
+        # Marks the cells a move is about to change, called before the world applies it
+        x, y = self.world.position
+        dx, dy = World.directions[self.world.direction]
+        cells = [(x, y)]
+
+        if move == 'F':
+            cells.append((x + dx, y + dy))
+        elif move == 'G':
+            cells += [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]  # Glow around a potion goes away
+        elif move == 'S':
+            tx, ty = x + dx, y + dy  # Stench around a killed wumpus goes away
+            cells += [(tx, ty), (tx - 1, ty), (tx + 1, ty), (tx, ty - 1), (tx, ty + 1)]
+
+        self.dirty.update((i, j) for i, j in cells if 0 <= i < self.N and 0 <= j < self.N)
+
+    def update_map(self):
+        # Redraws only the cells marked since the last update
+        for i, j in self.dirty:
+            self.draw_cell(i, j)
+        self.dirty.clear()
 
 
     def color_map(self, symbol):
@@ -270,74 +283,109 @@ class Program:
         top_text_label.pack(anchor="nw", padx=10, pady=(self.text_position, 0))
 
 
+    def load_trace(self):
+        file_path = filedialog.askopenfilename(title="Select Trace File", filetypes=[("Trace Files", "*.trace")])
+        if not file_path:
+            return
+
+        try:
+            trace = Trace.load(file_path)
+        except ValueError as error:
+            messagebox.showerror("Wumpus World", str(error))
+            return
+
+        # Replays only need the world, the agent and its knowledge base are never built
+        self.pause_agent()
+        self.stop_worker()
+        self.replay = trace
+        self.trace = None
+        self.N = trace.size
+        self.replay_step = -1
+        self.replay_scale.config(to=len(trace), state="normal")
+
+        for widget in self.text_frame.winfo_children():
+            widget.destroy()
+        self.update_logic_frame(f"Trace loaded with {len(trace)} steps. Replaying.")
+
+        self.seek(0)
+        self.root.after(100, self.sync_logic_frame_size)
+
+    def seek(self, step):
+        # Shows the world as it was after the first `step` moves of the replay
+        if self.replay is None or step == self.replay_step:
+            return
+
+        step = max(0, min(step, len(self.replay)))
+        rewind = step < self.replay_step or self.replay_step < 0
+        if rewind:
+            self.world = self.replay.world()
+            self.smoke_coverage = [[True for _ in range(self.N)] for _ in range(self.N)]
+            initial_x, initial_y = self.world.position
+            self.smoke_coverage[initial_x][initial_y] = False
+            self.replay_step = 0
+
+        while self.replay_step < step:
+            move = self.replay[self.replay_step][0]
+            self.mark_move(move)
+            self.world.act(move)
+            x, y = self.world.position
+            self.smoke_coverage[x][y] = False
+            self.replay_step += 1
+
+        if step > 0:
+            _, _, self.score, self.health = self.replay[step - 1]
+        else:
+            self.score, self.health = 0, 100
+        self.score_label.config(text=f"Score: {self.score}")
+        self.health_label.config(text=f"Health: {self.health}")
+
+        self.replay_scale.set(step)
+        if rewind:
+            self.display_map()
+        else:
+            self.update_map()
+
+    def replay_next(self):
+        if self.replay_step >= len(self.replay):
+            self.running = False
+            return
+
+        move = self.replay[self.replay_step][0]
+        self.update_logic_frame(self.world.describe(move))
+        self.seek(self.replay_step + 1)
+
     def next_step(self):
-        percepts = self.get_percepts(self.agent_position)
-        move = self.agent.move(percepts)
-        
-        self.execute_move(move)
+        if self.replay is not None:
+            self.replay_next()
+            return
 
-    def _move_agent_position(self, direction):
-        x, y = self.agent_position
-        if direction == "up" and x > 0:
-            x -= 1
-        elif direction == "down" and x < self.N - 1:
-            x += 1
-        elif direction == "left" and y > 0:
-            y -= 1
-        elif direction == "right" and y < self.N - 1:
-            y += 1  
-
-        self.agent_position = (x, y)
+        if self.worker is None:
+            return
+
+        self.pending += 1
+        self.schedule(0)
+
+    def _move_agent_position(self):
+        self.world.forward()
+        x, y = self.world.position
         self.smoke_coverage[x][y] = False
-        self.display_map()
+        self.update_map()
 
     def get_percepts(self, position):
-        i, j = position
-        room_content = self.world_map[i][j].split()
-        percepts = [item for item in room_content if item in ['S', 'B', 'W_H', 'G_L', 'W', 'P', 'G', 'P_G', 'H_P']]
-        return percepts
+        return self.world.percepts(position)
     
 
     def _grab_item(self):
-        x, y = self.agent_position
-        room_content = self.world_map[x][y].split()
-        
-        if 'G' in room_content:
-            room_content.remove('G')
-        if 'H_P' in room_content:
-            room_content.remove('H_P')
-            self.remove_signals(x, y, ['G_L']) 
-            
-        self.world_map[x][y] = ' '.join(room_content)
-        self.display_map()
+        self.world.grab()
+        self.update_map()
 
     def _shoot_arrow(self):
-        x, y = self.agent_position
-
-        if self.agent_direction == "up" and x > 0:
-            target_x, target_y = x - 1, y
-        elif self.agent_direction == "down" and x < self.N - 1:
-            target_x, target_y = x + 1, y
-        elif self.agent_direction == "left" and y > 0:
-            target_x, target_y = x, y - 1
-        elif self.agent_direction == "right" and y < self.N - 1:
-            target_x, target_y = x, y + 1
-        else:
-            return False  # No valid target
-
-        room_content = self.world_map[target_x][target_y].split()
-
-        if 'W' in room_content:
-            room_content.remove('W')
-            self.world_map[target_x][target_y] = ' '.join(room_content)
-            self.remove_signals(target_x, target_y, ['S']) 
-            self.display_map()
-            return True  # Wumpus was killed
-
-        self.display_map()
-        return False  
+        killed = self.world.shoot()
+        self.update_map()
+        return killed
 
     def _climb_exit(self):
+        self.world.climb()
         self.running = False
         message = f"Agent finished Wumpus World with score: {self.score} and health: {self.health}"
         messagebox.showinfo("Wumpus World", message)
@@ -345,58 +393,81 @@ class Program:
 
 
     def _heal(self):
-        self.health = self.agent.health
         self.health_label.config(text=f"Health: {self.health}")
 
+    def set_interval(self, value):
+        self.run_interval = int(value)
+
     def run_agent(self):
         """Start running the agent automatically."""
         self.running = True
-        self._auto_move()
+        self.schedule(0)
 
     def pause_agent(self):
         """Pause the agent's automatic movement."""
         self.running = False
+        self.pending = 0
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+
+    def stop_worker(self):
+        if self.worker is not None:
+            self.worker.stop()
+            self.worker = None
+
+    def schedule(self, delay):
+        # Keeps a single poll callback alive, so Run and Next Step never double the pace
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+        self.poll_id = self.root.after(delay, self._auto_move)
 
     def _auto_move(self):
-        if self.running:
-            percepts = self.get_percepts(self.agent_position)
-            move = self.agent.move(percepts)
-            self.score = self.agent.score
-            self.score_label.config(text=f"Score: {self.score}")
-
-            self.health = self.agent.health
-            self.health_label.config(text=f"Health: {self.health}")  
+        self.poll_id = None
+        if not self.running and self.pending == 0:
+            return
+
+        if self.replay is not None:
+            self.replay_next()
+            if self.running:
+                self.schedule(self.run_interval)
+            return
+
+        # The worker computes ahead, so a move is usually ready and only rendering is paced
+        alive = self.worker is not None and self.worker.is_alive()
+        step = self.worker.next_move() if self.worker is not None else None
+        if step is None:
+            if not alive or self.world.done:
+                self.pause_agent()
+            else:
+                self.schedule(self.poll_interval)
+            return
+
+        move, percepts, self.score, self.health = step
+        self.trace.record(move, percepts, self.score, self.health)
+        self.pending = max(0, self.pending - 1)
+        self.execute_move(move)
 
-            self.execute_move(move)
-            self.root.after(self.run_interval, self._auto_move)
+        if self.running:
+            self.schedule(self.run_interval)
+        elif self.pending > 0:
+            self.schedule(0)
 
     def execute_move(self, move):
         killed = False
         """Execute the move returned by the agent."""
-        move_actions = {
-            'F': "Forward",
-            'L': "Turn Left",
-            'R': "Turn Right",
-            'G': "Grab",
-            'S': "Shoot Arrow",
-            'C': "Exit the Cave",
-            'H': "Heal"
-        }
-
-        action_name = move_actions.get(move, "Unknown Action")
+        action_name = World.actions.get(move, "Unknown Action")
         if action_name == "Unknown Action":
             self.running = False
             message = f"Agent got killed !!"
             messagebox.showinfo("Wumpus World", message)
             self.write_output()
 
-        output_x = self.N - int(self.agent_position[0])  
-        output_y = int(self.agent_position[1]) + 1
-        tmp_str = "(" + str(output_x) + "," + str(output_y) + "): " + action_name
-        self.logic_steps.append(tmp_str)
+        self.logic_steps.append(self.world.describe(move))
+        self.mark_move(move)
 
         if move == 'F':
-            self._move_agent_position(self.agent_direction)
+            self._move_agent_position()
         elif move == 'L':
             self._turn_left()
         elif move == 'R':
@@ -412,10 +483,7 @@ class Program:
 
 
 
-        self.score = self.agent.score
         self.score_label.config(text=f"Score: {self.score}")
-
-        self.health = self.agent.health
         self.health_label.config(text=f"Health: {self.health}")
 
         self.update_logic_frame(f"Agent performed move: {action_name}")
@@ -434,28 +502,16 @@ class Program:
             for step in self.logic_steps:
                 f.write(step + '\n')
 
+        # The binary trace goes to the untracked traces folder and can be replayed with Load Trace
+        trace_folder = os.path.join(os.getcwd(), "traces")
+        os.makedirs(trace_folder, exist_ok=True)
+        self.trace.save(os.path.join(trace_folder, os.path.splitext(output_file_name)[0] + ".trace"))
+
 
     def _turn_left(self):
-        directions = ["up", "left", "down", "right"]
-        current_idx = directions.index(self.agent_direction)
-        self.agent_direction = directions[(current_idx + 1) % 4]
-        self.display_map()
+        self.world.turn_left()
+        self.update_map()
 
     def _turn_right(self):
-        directions = ["up", "right", "down", "left"]
-        current_idx = directions.index(self.agent_direction)
-        self.agent_direction = directions[(current_idx + 1) % 4]
-        self.display_map()
-
-    def remove_signals(self, x, y, signals):
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
-
-        for di, dj in directions:
-            ni, nj = x + di, y + dj
-            if 0 <= ni < self.N and 0 <= nj < self.N:
-                room_content = self.world_map[ni][nj].split()
-                room_content = [item for item in room_content if item not in signals]
-                self.world_map[ni][nj] = ' '.join(room_content)
-
-        # After modifying the map, refresh the display
-        self.display_map()
\ No newline at end of file
+        self.world.turn_right()
+        self.update_map()
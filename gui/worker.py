@@ -0,0 +1,40 @@
+import queue
+import threading
+
+from core import Agent, World
+
+class Worker(threading.Thread):
+    """Plays the agent on its own copy of the world and streams the moves to the GUI."""
+
+    def __init__(self, text, ahead=64):
+        super().__init__(daemon=True)
+        self.world = World.parse(text)
+        self.agent = Agent(self.world.size)
+
+        # At most `ahead` decided moves wait for the GUI, then the worker blocks
+        self.moves = queue.Queue(maxsize=ahead)
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.world.done and not self.stopped.is_set():
+            percepts = self.world.percepts()
+            move = self.agent.move(percepts)
+            self.world.act(move)
+
+            step = (move, percepts, self.agent.score, self.agent.health)
+            while not self.stopped.is_set():
+                try:
+                    self.moves.put(step, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def stop(self):
+        self.stopped.set()
+
+    def next_move(self):
+        """Returns the next decided (move, percepts, score, health), or None if none is ready yet."""
+        try:
+            return self.moves.get_nowait()
+        except queue.Empty:
+            return None
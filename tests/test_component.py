@@ -0,0 +1,55 @@
+# test_component.py
+# =============================================================================
+#  Checks the inference tiers of a component against brute force.
+# =============================================================================
+
+import itertools
+import random
+
+from core import PySAT, Stats
+from core.component import Component
+
+class Counting(PySAT):
+	# A backend that records how often a component had to build one
+	built = 0
+
+	def __init__(self, clauses):
+		super().__init__(clauses)
+		Counting.built += 1
+
+def formulas(count, variables = 7, size = 3):
+	# Random CNFs over variables 11.. so components have to renumber them
+	generator = random.Random(0)
+	for _ in range(count):
+		clauses = []
+		for _ in range(generator.randint(4, 30)):
+			chosen = generator.sample(range(11, 11 + variables), size)
+			clauses.append(tuple(variable * generator.choice((1, -1)) for variable in chosen))
+		yield clauses
+
+def models(clauses):
+	variables = sorted({abs(literal) for clause in clauses for literal in clause})
+	for values in itertools.product((1, -1), repeat = len(variables)):
+		literals = {variable * value for variable, value in zip(variables, values)}
+		if all(any(literal in literals for literal in clause) for clause in clauses): yield literals
+
+def test_backbone_and_entailment_match_enumeration():
+	Counting.built = 0
+	for clauses in formulas(200):
+		found = list(models(clauses))
+		variables = {abs(literal) for clause in clauses for literal in clause}
+
+		component = Component(clauses, Stats(), Counting)
+		assert component.satisfiable() == (len(found) > 0)
+		if len(found) == 0: continue
+
+		backbone = {abs(literal): literal for literal in set.intersection(*found)}
+		assert component.backbone() == backbone
+
+		fresh = Component(clauses, Stats(), Counting)
+		for variable in variables:
+			for literal in (variable, -variable):
+				assert fresh.entails(literal) == all(literal in model for model in found)
+
+	# Propagation settles some formulas on its own, the rest reach the backend
+	assert 0 < Counting.built < 200
@@ -0,0 +1,142 @@
+# test_knowledge.py
+# =============================================================================
+#  Checks the knowledge base against freshly built references.
+# =============================================================================
+
+import itertools
+import math
+import random
+
+from core import Generator, Grid, Knowledge
+
+PROPERTIES = ['B', 'S', 'W_H', 'G_L', 'P', 'W', 'P_G', 'H_P', 'G']
+SIGNALS = {'P': 'B', 'W': 'S', 'P_G': 'W_H', 'H_P': 'G_L'}
+
+def world(size, seed):
+	# Room contents keyed by 1-based (x, y), with an empty start room
+	rows = Generator(seed, 0.15, 0.1, 0.1, 0.05, 0.05).generate(size)
+	rooms = {(x, y): rows[x - 1][y - 1] for x, y in Grid.of(size).cells}
+	rooms[(1, 1)] = '-'
+	return rooms
+
+def facts(size, rooms, x, y):
+	# Every property of a visited room, as (property, x, y, existence)
+	present = {rooms[(x, y)]}
+	for i, j in Grid.of(size).around(x, y):
+		if rooms[(i, j)] in SIGNALS: present.add(SIGNALS[rooms[(i, j)]])
+	return [(property, x, y, property in present) for property in PROPERTIES]
+
+def layers(knowledge):
+	belief = knowledge.snapshot()
+	return {property: bytes(belief.layer(property)) for property in PROPERTIES}
+
+def explore(size, seed):
+	# Visits rooms in a random order from the start room, grabbing gold on the
+	# way, and yields the knowledge base with every fact it holds after each visit
+	rooms = world(size, seed)
+	order = [(1, 1)] + random.Random(seed).sample(Grid.of(size).cells[1:], size * size - 1)
+	knowledge = Knowledge(size, lazy = True, profile = True)
+	held = set()
+
+	for x, y in order:
+		if rooms[(x, y)] in ('P', 'W'): continue
+		knowledge.begin()
+		for fact in facts(size, rooms, x, y):
+			knowledge.add(*fact)
+			held.add(fact)
+		knowledge.commit()
+		yield knowledge, held
+
+		# Grabbing gold retracts a fact, which makes the knowledge base start over
+		if rooms[(x, y)] == 'G':
+			rooms[(x, y)] = '-'
+			knowledge.remove('G', x, y, True)
+			knowledge.add('G', x, y, False)
+			held.discard(('G', x, y, True))
+			held.add(('G', x, y, False))
+			yield knowledge, held
+
+def test_incremental_components_match_a_fresh_knowledge_base():
+	for seed in range(6):
+		for knowledge, held in explore(5, seed):
+			reference = Knowledge(5)
+			for fact in held: reference.add(*fact)
+			assert layers(knowledge) == layers(reference)
+
+def test_forks_match_a_fresh_knowledge_base_and_leave_the_parent_alone():
+	# What-ifs: the child visits one more room, or forgets one fact
+	for seed in range(4):
+		rooms = world(5, seed)
+		generator = random.Random(seed)
+		for knowledge, held in explore(5, seed):
+			before = layers(knowledge)
+			visited = {(x, y) for _, x, y, _ in held}
+			unvisited = [cell for cell in Grid.of(5).cells if cell not in visited and rooms[cell] not in ('P', 'W')]
+
+			child = knowledge.fork()
+			supposed = set(held)
+			if unvisited and generator.random() < 0.5:
+				for fact in facts(5, rooms, *generator.choice(unvisited)):
+					child.add(*fact)
+					supposed.add(fact)
+			else:
+				fact = generator.choice(sorted(held))
+				child.remove(*fact)
+				supposed.discard(fact)
+
+			reference = Knowledge(5)
+			for fact in supposed: reference.add(*fact)
+			assert layers(child) == layers(reference)
+			assert layers(knowledge) == before
+
+def test_snapshots_count_cache_hits_and_misses():
+	for knowledge, _ in explore(5, 1): knowledge.snapshot()
+	counters = knowledge.stats.counters
+	assert counters['cache_misses'] > 0
+	assert counters['cache_hits'] > 0
+	assert counters['rebuilds'] > 0
+
+def test_risks_match_enumeration():
+	# Each danger on its own: every way of placing it in the unvisited rooms
+	# next to a visited one, weighted by the prior, that explains the sensed
+	# percepts. Rooms further away keep the prior
+	size = 4
+	around = {cell: set(Grid.of(size).around(*cell)) for cell in Grid.of(size).cells}
+	for seed in range(4):
+		for knowledge, held in explore(size, seed):
+			risks = knowledge.risks()
+			visited = {(x, y) for _, x, y, _ in held}
+			frontier = sorted(set().union(*(around[cell] for cell in visited)) - visited)
+
+			for danger, p in knowledge.priors.items():
+				# Gas does not kill, so explore can visit rooms holding it
+				found = {cell for cell in visited if (danger, *cell, True) in held}
+				sensed = {cell for cell in visited if (SIGNALS[danger], *cell, True) in held}
+				total = 0.0
+				chances = dict.fromkeys(frontier, 0.0)
+				for values in itertools.product((True, False), repeat = len(frontier)):
+					present = found | {cell for cell, value in zip(frontier, values) if value}
+					if any((cell in sensed) != bool(present & around[cell]) for cell in visited): continue
+					weight = math.prod(p if value else 1 - p for value in values)
+					total += weight
+					for cell in present - found: chances[cell] += weight
+
+				for x, y in Grid.of(size).cells:
+					expected = float((x, y) in found) if (x, y) in visited else chances[(x, y)] / total if (x, y) in chances else p
+					assert math.isclose(risks[danger][(x - 1) * size + y - 1], expected, abs_tol = 1e-12)
+
+def test_unconstrained_rooms_take_the_given_priors():
+	knowledge = Knowledge(4, lazy = True, priors = {'P': 0.2, 'W': 0.1})
+	for property in PROPERTIES: knowledge.add(property, 1, 1, False)
+	risks = knowledge.risks()
+	assert risks['P'][0] == 0.0 and risks['P'][15] == 0.2
+	assert risks['W'][15] == 0.1
+	assert risks['P_G'][15] == Generator.defaults['P_G']
+
+def test_possible_needs_a_neighbour_sensing_it():
+	knowledge = Knowledge(4, lazy = True)
+	for property in PROPERTIES: knowledge.add(property, 1, 1, property == 'B')
+	assert knowledge.possible('P', 1, 2) and knowledge.possible('P', 2, 1)
+	assert not knowledge.possible('P', 1, 1) and not knowledge.possible('P', 3, 3)
+	assert not knowledge.possible('W', 1, 2)
+	assert knowledge.possible('G', 3, 3)
@@ -0,0 +1,52 @@
+# test_replicas.py
+# =============================================================================
+#  Checks solver replicas in worker processes against in-process answers.
+# =============================================================================
+
+import gc
+import multiprocessing
+
+from core import Grid, Knowledge, PySAT, Stats
+from core.component import Component
+from core.replicas import Replicas
+
+from test_knowledge import PROPERTIES, explore, layers
+
+def test_replica_answers_match_in_process_answers():
+	for seed in range(3):
+		queries = [(property, x, y, existence) for property in PROPERTIES for x, y in Grid.of(5).cells for existence in (True, False)]
+		for knowledge, held in explore(5, seed):
+			replicated = Knowledge(5, lazy = True, workers = 2)
+			try:
+				for fact in held: replicated.add(*fact)
+				assert replicated.query_many(queries) == [knowledge.certain(*query[:3]) if query[3] else knowledge.impossible(*query[:3]) for query in queries]
+				assert layers(replicated) == layers(knowledge)
+			finally:
+				replicated.close()
+
+def test_dropped_components_are_forgotten_by_their_worker():
+	replicas = Replicas(1, PySAT)
+	try:
+		first = Component([(1, 2), (-1, 2)], Stats())
+		second = Component([(3, 4), (-3, -4)], Stats())
+		assert replicas.run({first: [2]}) == {first: [True]}
+		assert replicas.run({second: None}) == {second: dict()}
+
+		# The first component is collected after a later batch went out, its
+		# replica still has to be dropped with the next one
+		del first
+		gc.collect()
+		assert replicas.pending() == 1
+		replicas.run({second: [3]})
+		assert replicas.pending() == 0
+	finally:
+		replicas.close()
+
+def test_close_stops_the_workers():
+	running = set(multiprocessing.active_children())
+	knowledge = Knowledge(4, lazy = True, workers = 2)
+	processes = set(multiprocessing.active_children()) - running
+	assert len(processes) == 2
+	knowledge.close()
+	assert not any(process.is_alive() for process in processes)
+	knowledge.close()
@@ -0,0 +1,34 @@
+# test_rules.py
+# =============================================================================
+#  Checks the rule cache on disk.
+# =============================================================================
+
+from core import Rules
+
+def test_saved_rules_load_back_and_other_versions_are_rebuilt(tmp_path):
+	path = str(tmp_path / "rules_3.cnf")
+	rules = Rules(3)
+	rules.save(path)
+	loaded = Rules.load(path)
+	assert (loaded.size, loaded.clauses) == (3, rules.clauses)
+
+	with open(path, 'r') as file: text = file.read()
+	with open(path, 'w') as file: file.write(text.replace(f"c version {Rules.version}", f"c version {Rules.version - 1}"))
+	assert Rules.load(path) is None
+
+	# A stale file is replaced, whether or not this process compiled the size before
+	Rules.compile(3)
+	compiled = Rules.compile(3, str(tmp_path))
+	assert compiled.clauses == rules.clauses
+	assert Rules.load(path).clauses == rules.clauses
+
+def test_names_invert_symbols():
+	rules = Rules(4)
+	for property in Rules.properties:
+		for x, y in rules.grid.cells:
+			assert rules.name(rules.symbol(property, x, y)) == (property, x, y)
+
+def test_a_cache_directory_is_filled_after_an_in_memory_compile(tmp_path):
+	rules = Rules.compile(4)
+	assert Rules.compile(4, str(tmp_path)) is rules
+	assert Rules.load(str(tmp_path / "rules_4.cnf")).clauses == rules.clauses